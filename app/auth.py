@@ -1,33 +1,30 @@
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime, timedelta, timezone
 import jwt
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from app.models.users import User as UserModel
 from app.config import SECRET_KEY, ALGORITHM
 from app.db_depends import get_async_db
-
-# Создаём контекст для хеширования с использованием bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.principal_cache import principal_cache, _load_principal
+from app.password_hashing import password_hasher, pwd_context
 
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token")
 
-def hash_password(password: str) -> str:
+async def hash_password(password: str) -> str:
     """
-    Преобразует пароль в хеш с использованием bcrypt.
+    Преобразует пароль в хеш с использованием bcrypt (в пуле потоков).
     """
-    return pwd_context.hash(password)
+    return await password_hasher.run("hash", pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
     """
-    Проверяет, соответствует ли введённый пароль сохранённому хешу.
+    Проверяет пароль и, если хеш создан с другой стоимостью (BCRYPT_ROUNDS), возвращает новый хеш.
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.run("verify", pwd_context.verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict):
     """
@@ -57,7 +54,8 @@ def create_refresh_token(data: dict):
 
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """
-    Проверяет JWT и возвращает пользователя из базы.
+    Проверяет JWT и возвращает пользователя (Principal): по id из токена — через кэш
+    principal_cache, для токенов без id — запросом по email.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -68,6 +66,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
+        user_id: int | None = payload.get("id")
 
         if email is None:
             raise credentials_exception
@@ -82,10 +81,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     except jwt.PyJWTError:
         raise credentials_exception
 
-    result = await db.scalars(select(UserModel).where(UserModel.email == email, UserModel.is_active == True))
-    user = result.first()
+    if isinstance(user_id, int):
+        user = await principal_cache.get(db, user_id)
+    else:
+        user = await _load_principal(db, UserModel.email == email)
 
-    if user is None:
+    # id и email токена должны указывать на одного и того же пользователя
+    if user is None or user.email != email:
         raise credentials_exception
 
     return user
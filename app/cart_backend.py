@@ -0,0 +1,486 @@
+import json
+from decimal import Decimal
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from app.config import CART_BACKEND, CART_REDIS_TTL, CART_FLUSH_BATCH_SIZE, CART_SUMMARY_CACHE_TTL, STOCK_HOLDS_ENABLED
+from app.models.products import Product as ProductModel
+from app.models.cart_items import CartItem as CartItemModel
+from app.product_cache import product_cache
+from app.redis_client import get_redis, RedisScript, cache_generation, set_cached, invalidate_cached
+from app.stock_holds import lock_stock_holds, hold_stock, release_holds
+from app.utils import _cart_add_item, _cart_set_quantity, _cart_remove_item, _cart_item_from_row
+
+# Множество пользователей, чьи корзины в Redis изменились после последнего сброса в cart_items
+CART_DIRTY_KEY = "cart:dirty"
+# Служебное поле хэша корзины: ключ существует, пока корзина загружена в Redis, даже пустая.
+# Отсутствие ключа значит, что хэш истёк или потерян и корзину нужно восстановить из cart_items
+CART_LOADED_FIELD = "loaded"
+
+async def _load_cart_in_memory(redis, keys: list[str], args: list) -> int:
+    if await redis.exists(keys[0]):
+        return 0
+    ttl, *pairs = args
+    await redis.hset(keys[0], mapping=dict(zip(pairs[::2], pairs[1::2])))
+    await redis.expire(keys[0], ttl)
+    return 1
+
+# Загружает корзину (ARGV: TTL, затем пары поле-значение), только если ключа ещё нет:
+# параллельные восстановления не затирают уже изменённую корзину
+_LOAD_CART = RedisScript(
+    """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return 1
+    """,
+    _load_cart_in_memory,
+)
+
+async def _reset_cart_in_memory(redis, keys: list[str], args: list) -> None:
+    await redis.delete(keys[0])
+    await redis.hset(keys[0], CART_LOADED_FIELD, 1)
+    await redis.expire(keys[0], args[0])
+
+# Очищает корзину, оставляя её загруженной (ARGV: TTL)
+_RESET_CART = RedisScript(
+    f"""
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], '{CART_LOADED_FIELD}', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    """,
+    _reset_cart_in_memory,
+)
+
+async def _subtract_lines_in_memory(redis, keys: list[str], args: list) -> None:
+    if not await redis.exists(keys[0]):
+        return
+    for product_id, quantity in zip(args[::2], args[1::2]):
+        if await redis.hincrby(keys[0], product_id, -int(quantity)) <= 0:
+            await redis.hdel(keys[0], product_id)
+
+# Вычитает количества (ARGV: пары товар-количество) и удаляет позиции, дошедшие до нуля;
+# количество, добавленное параллельно, остаётся в корзине
+_SUBTRACT_LINES = RedisScript(
+    """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return
+    end
+    for i = 1, #ARGV, 2 do
+        if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) <= 0 then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+    """,
+    _subtract_lines_in_memory,
+)
+
+async def _set_line_in_memory(redis, keys: list[str], args: list) -> int:
+    if not await redis.hexists(keys[0], args[0]):
+        return 0
+    await redis.hset(keys[0], args[0], args[1])
+    return 1
+
+# Меняет количество позиции (ARGV: товар, количество), только если она есть в корзине:
+# позиция, удалённая параллельно, не возвращается. Возвращает 0, если позиции нет
+_SET_LINE = RedisScript(
+    """
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    return 1
+    """,
+    _set_line_in_memory,
+)
+
+async def _claim_cart_in_memory(redis, keys: list[str], args: list) -> list:
+    cart = await redis.hgetall(keys[0])
+    await _reset_cart_in_memory(redis, keys, args)
+    return [value for line in cart.items() for value in line]
+
+# Забирает позиции корзины и очищает её одной операцией (ARGV: TTL): из двух параллельных
+# оформлений позиции достаются только одному. Возвращает HGETALL в виде плоского списка
+_CLAIM_CART = RedisScript(
+    f"""
+    local cart = redis.call('HGETALL', KEYS[1])
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], '{CART_LOADED_FIELD}', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return cart
+    """,
+    _claim_cart_in_memory,
+)
+
+async def _return_lines_in_memory(redis, keys: list[str], args: list) -> None:
+    ttl, *pairs = args
+    for product_id, quantity in zip(pairs[::2], pairs[1::2]):
+        await redis.hincrby(keys[0], product_id, int(quantity))
+    await redis.hset(keys[0], CART_LOADED_FIELD, 1)
+    await redis.expire(keys[0], ttl)
+
+# Возвращает в корзину позиции несостоявшегося заказа (ARGV: TTL, затем пары товар-количество),
+# складывая их с добавленным за время оформления
+_RETURN_LINES = RedisScript(
+    f"""
+    for i = 2, #ARGV, 2 do
+        redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', KEYS[1], '{CART_LOADED_FIELD}', 1)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    """,
+    _return_lines_in_memory,
+)
+
+def _summary_columns(quantity, price):
+    return (
+        func.count().label("items_count"),
+        func.coalesce(func.sum(quantity), 0).label("total_quantity"),
+        func.coalesce(func.sum(quantity * price), 0).label("total_price"),
+    )
+
+class SqlCartBackend:
+    """
+    Корзина в таблице cart_items: каждая операция — один запрос к PostgreSQL.
+    """
+
+    async def get_items(self, db: AsyncSession, user_id: int) -> list:
+        result = await db.scalars(
+            select(CartItemModel)
+            .options(selectinload(CartItemModel.product))
+            .where(CartItemModel.user_id == user_id)
+            .order_by(CartItemModel.id)
+        )
+        return result.all()
+
+    async def get_summary(self, db: AsyncSession, user_id: int) -> dict:
+        """
+        Итоги корзины одним агрегирующим запросом по cart_items JOIN products.
+        """
+        result = await db.execute(
+            select(*_summary_columns(CartItemModel.quantity, ProductModel.price))
+            .join(ProductModel, ProductModel.id == CartItemModel.product_id)
+            .where(CartItemModel.user_id == user_id)
+        )
+        return dict(result.one()._mapping)
+
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+        # Проверка товара, вставка или увеличение количества — один запрос
+        row = await _cart_add_item(db, user_id, product_id, quantity)
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
+        if STOCK_HOLDS_ENABLED:
+            # Бронь на всё количество позиции в той же транзакции; при нехватке корзина не меняется
+            await hold_stock(db, user_id, product_id, row.item_quantity)
+        await db.commit()
+        return _cart_item_from_row(row)
+
+    async def set_quantity(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+        row = await _cart_set_quantity(db, user_id, product_id, quantity)
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
+        if row.item_id is None:
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        if STOCK_HOLDS_ENABLED:
+            await hold_stock(db, user_id, product_id, quantity)
+        await db.commit()
+        return _cart_item_from_row(row)
+
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> None:
+        if not await _cart_remove_item(db, user_id, product_id):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        if STOCK_HOLDS_ENABLED:
+            await release_holds(db, user_id, [product_id])
+        await db.commit()
+
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        if STOCK_HOLDS_ENABLED:
+            await release_holds(db, user_id)
+        await db.commit()
+
+    async def take_lines(self, db: AsyncSession, user_id: int) -> list[tuple[int, int]]:
+        """
+        Забирает позиции корзины для заказа в транзакции db и возвращает [(product_id, quantity)].
+        Корзина забирается и очищается одним DELETE ... RETURNING: позиции, добавленные
+        параллельно, не пропадут молча; при ошибке откат вернёт корзину как была.
+        """
+        result = await db.execute(
+            delete(CartItemModel)
+            .where(CartItemModel.user_id == user_id)
+            .returning(CartItemModel.id, CartItemModel.product_id, CartItemModel.quantity)
+        )
+        return [(row.product_id, row.quantity) for row in sorted(result, key=lambda row: row.id)]
+
+    async def return_lines(self, user_id: int, lines: list[tuple[int, int]]) -> None:
+        # Позиции вернул откат транзакции заказа
+        pass
+
+    async def after_checkout(self, user_id: int, lines: list[tuple[int, int]]) -> None:
+        pass
+
+class RedisCartBackend:
+    """
+    Корзина в Redis: хэш cart:<user_id> вида {product_id: quantity}, данные товаров — из ProductCache.
+    Запросы к PostgreSQL нужны только на промах кэша товаров. Изменённые корзины отмечаются
+    в CART_DIRTY_KEY и сбрасываются в cart_items периодической задачей (flush_dirty_carts).
+    Истёкший или потерянный хэш восстанавливается из cart_items при следующем обращении.
+    Id позиции в ответах равен id товара.
+    """
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"cart:{user_id}"
+
+    async def _touch(self, user_id: int) -> None:
+        redis = get_redis()
+        await redis.expire(self._key(user_id), CART_REDIS_TTL)
+        await redis.sadd(CART_DIRTY_KEY, user_id)
+
+    async def _available_product(self, db: AsyncSession, product_id: int) -> dict:
+        product = await product_cache.get(db, product_id)
+        if product is None or not product["is_active"]:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
+        return product
+
+    async def _load(self, db: AsyncSession, user_id: int) -> None:
+        """
+        Если хэша корзины нет в Redis, загружает в него последнюю сброшенную копию из cart_items.
+        """
+        redis = get_redis()
+        if await redis.exists(self._key(user_id)):
+            return
+        result = await db.execute(
+            select(CartItemModel.product_id, CartItemModel.quantity).where(CartItemModel.user_id == user_id)
+        )
+        args = [CART_REDIS_TTL, CART_LOADED_FIELD, 1]
+        for row in result:
+            args.extend((row.product_id, row.quantity))
+        await _LOAD_CART(redis, [self._key(user_id)], args)
+
+    async def get_lines(self, db: AsyncSession, user_id: int) -> list[tuple[int, int]]:
+        redis = get_redis()
+        cart = await redis.hgetall(self._key(user_id))
+        if not cart:
+            # У загруженной корзины всегда есть служебное поле, пустой ответ — хэша нет
+            await self._load(db, user_id)
+            cart = await redis.hgetall(self._key(user_id))
+        return sorted(
+            (int(product_id), int(quantity))
+            for product_id, quantity in cart.items()
+            if product_id != CART_LOADED_FIELD
+        )
+
+    async def get_items(self, db: AsyncSession, user_id: int) -> list[dict]:
+        lines = await self.get_lines(db, user_id)
+        products = await product_cache.get_many(db, [product_id for product_id, _ in lines])
+        return [
+            {"id": product_id, "quantity": quantity, "product": products[product_id]}
+            for product_id, quantity in lines
+            if product_id in products
+        ]
+
+    async def get_summary(self, db: AsyncSession, user_id: int) -> dict:
+        """
+        Итоги корзины: позиции из Redis передаются списком VALUES и соединяются с products
+        в одном агрегирующем запросе (цены — актуальные, не из кэша товаров).
+        """
+        lines = await self.get_lines(db, user_id)
+        if not lines:
+            return {"items_count": 0, "total_quantity": 0, "total_price": Decimal("0")}
+        cart = values(column("product_id", Integer), column("quantity", Integer), name="cart").data(lines)
+        result = await db.execute(
+            select(*_summary_columns(cart.c.quantity, ProductModel.price))
+            .select_from(cart)
+            .join(ProductModel, ProductModel.id == cart.c.product_id)
+        )
+        return dict(result.one()._mapping)
+
+    async def add_item(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+        product = await self._available_product(db, product_id)
+        await self._load(db, user_id)
+        redis = get_redis()
+        if not STOCK_HOLDS_ENABLED:
+            # HINCRBY атомарен, параллельные добавления не теряются
+            new_quantity = await redis.hincrby(self._key(user_id), product_id, quantity)
+            await self._touch(user_id)
+            return {"id": product_id, "quantity": new_quantity, "product": product}
+
+        # Количество читается под блокировкой броней пользователя, а корзина меняется до её снятия
+        # (commit): параллельные добавления идут по очереди, и бронь совпадает с количеством
+        # в корзине. При нехватке hold_stock откатывает транзакцию, корзина не меняется
+        await lock_stock_holds(db, user_id)
+        held_in_cart = int(await redis.hget(self._key(user_id), product_id) or 0)
+        await hold_stock(db, user_id, product_id, held_in_cart + quantity)
+        new_quantity = await redis.hincrby(self._key(user_id), product_id, quantity)
+        try:
+            await db.commit()
+        except Exception:
+            await _SUBTRACT_LINES(redis, [self._key(user_id)], [product_id, quantity])
+            raise
+        await self._touch(user_id)
+        return {"id": product_id, "quantity": new_quantity, "product": product}
+
+    async def set_quantity(self, db: AsyncSession, user_id: int, product_id: int, quantity: int) -> dict:
+        product = await self._available_product(db, product_id)
+        await self._load(db, user_id)
+        redis = get_redis()
+        if STOCK_HOLDS_ENABLED:
+            await lock_stock_holds(db, user_id)
+            if not await redis.hexists(self._key(user_id), product_id):
+                raise HTTPException(status_code=404, detail="Cart item not found")
+            await hold_stock(db, user_id, product_id, quantity)
+        # Проверка позиции и запись — одним скриптом: удалённая параллельно позиция не вернётся
+        if not await _SET_LINE(redis, [self._key(user_id)], [product_id, quantity]):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        if STOCK_HOLDS_ENABLED:
+            await db.commit()
+        await self._touch(user_id)
+        return {"id": product_id, "quantity": quantity, "product": product}
+
+    async def remove_item(self, db: AsyncSession, user_id: int, product_id: int) -> None:
+        await self._load(db, user_id)
+        if STOCK_HOLDS_ENABLED:
+            await lock_stock_holds(db, user_id)
+        if not await get_redis().hdel(self._key(user_id), product_id):
+            raise HTTPException(status_code=404, detail="Cart item not found")
+        await self._touch(user_id)
+        if STOCK_HOLDS_ENABLED:
+            await release_holds(db, user_id, [product_id])
+            await db.commit()
+
+    async def clear(self, db: AsyncSession, user_id: int) -> None:
+        redis = get_redis()
+        if STOCK_HOLDS_ENABLED:
+            await lock_stock_holds(db, user_id)
+        await _RESET_CART(redis, [self._key(user_id)], [CART_REDIS_TTL])
+        await redis.sadd(CART_DIRTY_KEY, user_id)
+        if STOCK_HOLDS_ENABLED:
+            await release_holds(db, user_id)
+            await db.commit()
+
+    async def take_lines(self, db: AsyncSession, user_id: int) -> list[tuple[int, int]]:
+        """
+        Забирает позиции корзины для заказа: хэш читается и очищается одним скриптом,
+        поэтому параллельное оформление получает пустую корзину. Если заказ не зафиксирован,
+        позиции возвращаются через return_lines. Сброшенная ранее копия в cart_items
+        удаляется в той же транзакции, что и создание заказа.
+        """
+        await self._load(db, user_id)
+        cart = await _CLAIM_CART(get_redis(), [self._key(user_id)], [CART_REDIS_TTL])
+        await db.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        return sorted(
+            (int(product_id), int(quantity))
+            for product_id, quantity in zip(cart[::2], cart[1::2])
+            if product_id != CART_LOADED_FIELD
+        )
+
+    async def return_lines(self, user_id: int, lines: list[tuple[int, int]]) -> None:
+        """
+        Возвращает в корзину позиции, забранные take_lines, если заказ не зафиксирован.
+        """
+        args = [CART_REDIS_TTL, *(value for line in lines for value in line)]
+        await _RETURN_LINES(get_redis(), [self._key(user_id)], args)
+        await self._touch(user_id)
+
+    async def after_checkout(self, user_id: int, lines: list[tuple[int, int]]) -> None:
+        """
+        После commit заказа отмечает корзину для сброса в cart_items: оформленные позиции
+        уже забраны take_lines, добавленное параллельно с оформлением остаётся. Кэш товаров
+        сбрасывает оформление заказа (_invalidate_products).
+        """
+        await self._touch(user_id)
+
+cart_backend = RedisCartBackend() if CART_BACKEND == "redis" else SqlCartBackend()
+
+def get_cart_backend() -> SqlCartBackend | RedisCartBackend:
+    """
+    Зависимость: хранилище корзины, выбранное CART_BACKEND.
+    """
+    return cart_backend
+
+def _summary_key(user_id: int) -> str:
+    return f"cart_summary:{user_id}"
+
+async def get_cart_summary(db: AsyncSession, backend: SqlCartBackend | RedisCartBackend, user_id: int) -> dict:
+    """
+    Итоги корзины пользователя из кэша в Redis (CART_SUMMARY_CACHE_TTL), на промахе — одним запросом.
+    """
+    redis = get_redis()
+    key = _summary_key(user_id)
+    cached = await redis.get(key)
+    if cached is not None:
+        summary = json.loads(cached)
+        summary["total_price"] = Decimal(summary["total_price"])
+        return summary
+
+    # Поколение читается до итогов: изменение корзины, сброшенное во время подсчёта, не будет перезаписано
+    generation = await cache_generation(redis, key)
+    summary = {"user_id": user_id, **await backend.get_summary(db, user_id)}
+    await set_cached(redis, key, json.dumps(summary, default=str), CART_SUMMARY_CACHE_TTL, generation)
+    return summary
+
+async def invalidate_cart_summary(user_id: int) -> None:
+    """
+    Сбрасывает кэш итогов корзины; вызывается после каждого изменения корзины.
+    """
+    await invalidate_cached(get_redis(), _summary_key(user_id))
+
+async def flush_dirty_carts(db: AsyncSession, redis, batch_size: int = CART_FLUSH_BATCH_SIZE) -> int:
+    """
+    Переносит изменённые корзины из Redis в cart_items пачками по batch_size пользователей:
+    строки, которых больше нет в корзине, удаляются, остальные вставляются или обновляются.
+    Корзины, хэша которых в Redis уже нет, не трогаются.
+    Возвращает количество обработанных корзин.
+    """
+    flushed = 0
+    while True:
+        user_ids = [int(user_id) for user_id in await redis.spop(CART_DIRTY_KEY, batch_size)]
+        if not user_ids:
+            return flushed
+        try:
+            carts = {}
+            for user_id in user_ids:
+                cart = await redis.hgetall(RedisCartBackend._key(user_id))
+                # Пропавший хэш (истёк или потерян) — не пустая корзина: копия в cart_items сохраняется
+                if cart:
+                    carts[user_id] = cart
+            lines = [
+                (user_id, int(product_id), int(quantity))
+                for user_id, cart in carts.items()
+                for product_id, quantity in cart.items()
+                if product_id != CART_LOADED_FIELD
+            ]
+
+            if lines:
+                rows = values(
+                    column("user_id", Integer), column("product_id", Integer), column("quantity", Integer),
+                    name="v",
+                ).data(lines)
+                await db.execute(
+                    delete(CartItemModel).where(
+                        CartItemModel.user_id.in_(list(carts)),
+                        ~select(rows.c.user_id).where(
+                            rows.c.user_id == CartItemModel.user_id,
+                            rows.c.product_id == CartItemModel.product_id,
+                        ).exists(),
+                    )
+                )
+                stmt = pg_insert(CartItemModel).from_select(["user_id", "product_id", "quantity"], select(rows))
+                await db.execute(stmt.on_conflict_do_update(
+                    constraint="uq_cart_items_user_product",
+                    set_={"quantity": stmt.excluded.quantity},
+                ))
+            elif carts:
+                await db.execute(delete(CartItemModel).where(CartItemModel.user_id.in_(list(carts))))
+            await db.commit()
+        except Exception:
+            # Корзины остаются «грязными» до следующего запуска
+            await db.rollback()
+            await redis.sadd(CART_DIRTY_KEY, *user_ids)
+            raise
+        flushed += len(user_ids)
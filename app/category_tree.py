@@ -0,0 +1,76 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import CATEGORY_TREE_CHECK_INTERVAL
+from app.models.categories import Category as CategoryModel
+from app.schemas import CategoryTreeNode
+from app.versions import get_versions
+
+_tree_adapter = TypeAdapter(list[CategoryTreeNode])
+
+@dataclass(frozen=True)
+class CategoryTreeSnapshot:
+    """
+    Неизменяемый снимок дерева активных категорий: уже сериализованный JSON
+    и версия категорий, по которой он построен.
+    """
+    version: int
+    body: bytes
+
+class CategoryTreeCache:
+    """
+    Снимок дерева категорий в памяти процесса.
+    Версия категорий проверяется не чаще раза в CATEGORY_TREE_CHECK_INTERVAL секунд
+    (одно чтение последовательности), дерево перестраивается только при её изменении,
+    причём одной корутиной — остальные ждут на блокировке и получают готовый снимок.
+    """
+
+    def __init__(self, check_interval: float = CATEGORY_TREE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot: CategoryTreeSnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> CategoryTreeSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        (version,) = await get_versions(db, "categories")
+        if snapshot is None or snapshot.version != version:
+            async with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self._snapshot = CategoryTreeSnapshot(version, await _render_tree(db))
+        self._checked_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self) -> None:
+        """
+        Заставляет следующий запрос сверить версию, не дожидаясь интервала проверки.
+        """
+        self._checked_at = 0.0
+
+category_tree_cache = CategoryTreeCache()
+
+async def _render_tree(db: AsyncSession) -> bytes:
+    """
+    Строит дерево активных категорий одним запросом и сериализует его в JSON.
+    Активная категория с неактивным родителем становится корнем — как и в таблице замыкания,
+    поддерево удалённой категории отвязано от её предков.
+    """
+    rows = (await db.execute(
+        select(CategoryModel.id, CategoryModel.name, CategoryModel.parent_id)
+        .where(CategoryModel.is_active == True)
+        .order_by(CategoryModel.name, CategoryModel.id)
+    )).all()
+
+    nodes = {row.id: CategoryTreeNode(id=row.id, name=row.name) for row in rows}
+    roots = []
+    for row in rows:
+        parent = nodes.get(row.parent_id)
+        (parent.children if parent is not None else roots).append(nodes[row.id])
+    return _tree_adapter.dump_json(roots)
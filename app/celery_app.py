@@ -0,0 +1,71 @@
+import asyncio
+from celery import Celery
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import NullPool
+from app.config import (
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    CELERY_TASK_ALWAYS_EAGER,
+    CART_BACKEND,
+    CART_FLUSH_INTERVAL,
+    ORDER_PENDING_RESUME_AFTER,
+    STOCK_HOLDS_ENABLED,
+    STOCK_HOLD_SWEEP_INTERVAL,
+    STOCK_SLOTS_SYNC_INTERVAL,
+)
+from app.database import DATABASE_URL
+
+celery = Celery(
+    "app.main",
+    broker=CELERY_BROKER_URL,
+    backend=CELERY_RESULT_BACKEND,
+    broker_connection_retry_on_startup=True,
+    include=['app.celery_task', 'app.order_tasks']
+)
+celery.conf.update(
+    task_always_eager=CELERY_TASK_ALWAYS_EAGER,
+    task_eager_propagates=True,
+    # Задача подтверждается после выполнения: при падении воркера она будет выполнена повторно
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    task_track_started=True,
+)
+
+celery.conf.beat_schedule = {
+    "resume-pending-orders": {
+        "task": "app.order_tasks.resume_pending_orders",
+        "schedule": ORDER_PENDING_RESUME_AFTER,
+    },
+    "sync-stock-slots": {
+        "task": "app.celery_task.sync_stock_slots",
+        "schedule": STOCK_SLOTS_SYNC_INTERVAL,
+    },
+}
+# Корзины из Redis периодически сохраняются в cart_items
+if CART_BACKEND == "redis":
+    celery.conf.beat_schedule["flush-carts"] = {
+        "task": "app.celery_task.flush_carts",
+        "schedule": CART_FLUSH_INTERVAL,
+    }
+# Просроченные брони остатков возвращаются в продажу
+if STOCK_HOLDS_ENABLED:
+    celery.conf.beat_schedule["release-stock-holds"] = {
+        "task": "app.celery_task.release_stock_holds",
+        "schedule": STOCK_HOLD_SWEEP_INTERVAL,
+    }
+
+def run_async(func, *args):
+    """
+    Выполняет async-функцию func(session, *args) из синхронной задачи Celery.
+    Каждый вызов идёт в своём event loop, поэтому движок создаётся без пула соединений
+    и закрывается по завершении.
+    """
+    async def runner():
+        engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+                return await func(session, *args)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(runner())
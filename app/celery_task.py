@@ -1,5 +1,11 @@
 import time
-from app.main import celery, app
+from app.main import app
+from app.celery_app import celery, run_async
+from app.cart_backend import flush_dirty_carts
+from app.stock_holds import release_expired_holds
+from app.utils import _sync_stock_slots, _fold_stock_slots, _invalidate_products
+from app.config import STOCK_SLOTS_ENABLED
+from app.redis_client import make_redis
 
 """ Functions to show how works background tasks """
 @celery.task
@@ -11,4 +17,52 @@ def call_background_task(message):
 @app.get("/test_1")
 async def hello_world(message: str):
     call_background_task.delay(message)
-    return {'message': 'Hello World!'}
\ No newline at end of file
+    return {'message': 'Hello World!'}
+
+
+@celery.task
+def flush_carts():
+    """
+    Периодически переносит изменённые корзины из Redis в cart_items (CART_BACKEND=redis).
+    """
+    return run_async(_flush_carts)
+
+async def _flush_carts(session) -> int:
+    # Клиент redis.asyncio привязан к event loop задачи, поэтому свой на каждый запуск
+    redis = make_redis()
+    try:
+        return await flush_dirty_carts(session, redis)
+    finally:
+        await redis.aclose()
+
+
+@celery.task
+def release_stock_holds():
+    """
+    Периодически снимает просроченные брони остатков (STOCK_HOLDS_ENABLED).
+    """
+    return run_async(release_expired_holds)
+
+@celery.task
+def sync_stock_slots():
+    """
+    Периодически переносит сумму слотов остатка в products.stock.
+    При включённых бронях остатков слоты, оставшиеся с прежнего режима, выключаются.
+    """
+    return run_async(_sync_slots)
+
+async def _sync_slots(session) -> int:
+    if STOCK_SLOTS_ENABLED:
+        product_ids = await _sync_stock_slots(session)
+    else:
+        product_ids = await _fold_stock_slots(session)
+    await session.commit()
+    if product_ids:
+        # Остаток в списках товаров изменился — новый ETag, сброс кэша total и товаров корзины.
+        # Клиент redis.asyncio привязан к event loop задачи, поэтому свой на каждый запуск
+        redis = make_redis()
+        try:
+            await _invalidate_products(session, product_ids, redis)
+        finally:
+            await redis.aclose()
+    return len(product_ids)
@@ -3,4 +3,94 @@ from dotenv import load_dotenv
 
 load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = "HS256"
\ No newline at end of file
+ALGORITHM = "HS256"
+
+# Пароли: стоимость bcrypt (хеши с другой стоимостью перехешируются при входе),
+# потоки пула хеширования (0 — считать прямо в event loop) и сколько операций
+# может ждать пула, прежде чем новые запросы получат 503
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+
+# Режим поиска товаров: "fulltext" (tsvector + триграммы, сортировка по релевантности)
+# или "like" (прежний поиск подстроки в названии)
+PRODUCT_SEARCH_MODE = os.getenv("PRODUCT_SEARCH_MODE", "fulltext")
+
+# Подсчёт total в GET /products/: "exact" — всегда точный COUNT (с кэшем),
+# "estimated" — оценка планировщика, если она не меньше порога PRODUCT_COUNT_ESTIMATE_THRESHOLD
+PRODUCT_COUNT_MODE = os.getenv("PRODUCT_COUNT_MODE", "exact")
+PRODUCT_COUNT_ESTIMATE_THRESHOLD = int(os.getenv("PRODUCT_COUNT_ESTIMATE_THRESHOLD", "100000"))
+# Кэш total по набору фильтров; сбрасывается при изменении товаров, в других воркерах живёт до TTL
+PRODUCT_COUNT_CACHE_TTL = float(os.getenv("PRODUCT_COUNT_CACHE_TTL", "30"))
+PRODUCT_COUNT_CACHE_SIZE = int(os.getenv("PRODUCT_COUNT_CACHE_SIZE", "1024"))
+
+# Как часто (в секундах) воркер сверяет снимок дерева категорий с версией в БД
+CATEGORY_TREE_CHECK_INTERVAL = float(os.getenv("CATEGORY_TREE_CHECK_INTERVAL", "1"))
+
+# Кэш аутентифицированных пользователей по id из токена: размер и TTL в памяти воркера,
+# как часто (в секундах) сверяется версия пользователей (смена роли, блокировка)
+# и нужен ли общий второй уровень в Redis
+PRINCIPAL_CACHE_ENABLED = os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "300"))
+PRINCIPAL_CACHE_CHECK_INTERVAL = float(os.getenv("PRINCIPAL_CACHE_CHECK_INTERVAL", "1"))
+PRINCIPAL_CACHE_REDIS = os.getenv("PRINCIPAL_CACHE_REDIS", "false").lower() in ("1", "true", "yes")
+
+# Размер порции серверного курсора для GET /products/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# POST /products/bulk: максимум позиций в запросе и размер пачки на один INSERT
+PRODUCT_BULK_MAX_ITEMS = int(os.getenv("PRODUCT_BULK_MAX_ITEMS", "10000"))
+PRODUCT_BULK_BATCH_SIZE = int(os.getenv("PRODUCT_BULK_BATCH_SIZE", "1000"))
+
+# Redis: тот же сервер, что у Celery; memory:// — хранилище в памяти процесса (тесты, локальный запуск)
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Хранилище корзины: "sql" — таблица cart_items (по умолчанию), "redis" — хэш на пользователя в Redis,
+# который сбрасывается в cart_items при оформлении заказа и периодически (CART_FLUSH_INTERVAL, секунды)
+CART_BACKEND = os.getenv("CART_BACKEND", "sql")
+CART_REDIS_TTL = int(os.getenv("CART_REDIS_TTL", str(30 * 24 * 3600)))
+CART_FLUSH_INTERVAL = float(os.getenv("CART_FLUSH_INTERVAL", "60"))
+CART_FLUSH_BATCH_SIZE = int(os.getenv("CART_FLUSH_BATCH_SIZE", "500"))
+# Кэш данных товаров в Redis для корзины
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", "60"))
+# Кэш GET /cart/summary на пользователя; сбрасывается изменениями корзины, смену цен догоняет по TTL
+CART_SUMMARY_CACHE_TTL = int(os.getenv("CART_SUMMARY_CACHE_TTL", "30"))
+# Кэш GET /products/{id}/rating; сбрасывается при создании и удалении отзывов о товаре
+PRODUCT_RATING_CACHE_TTL = int(os.getenv("PRODUCT_RATING_CACHE_TTL", "300"))
+
+# Idempotency-Key: сколько хранится ответ (секунды), на сколько занимается ключ выполняющимся запросом,
+# сколько повтор ждёт завершения первого запроса и как часто проверяет
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", "60"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.05"))
+
+# Celery: брокер и хранилище результатов (memory:// брокер kombu подходит для тестов),
+# eager-режим выполняет задачи сразу в вызывающем процессе
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://127.0.0.1:6379/0")
+CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://127.0.0.1:6379/0")
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "false").lower() in ("1", "true", "yes")
+
+# Обработка заказов: заглушка платёжного шлюза ("approve" — одобрять, "decline" — отклонять,
+# "flaky" — через раз временная ошибка), сколько раз повторять шаги и через сколько секунд
+# заново ставить в очередь зависшие заказы в статусе pending
+PAYMENT_STUB_MODE = os.getenv("PAYMENT_STUB_MODE", "approve")
+ORDER_TASK_MAX_RETRIES = int(os.getenv("ORDER_TASK_MAX_RETRIES", "5"))
+ORDER_PENDING_RESUME_AFTER = int(os.getenv("ORDER_PENDING_RESUME_AFTER", "600"))
+
+# Брони остатков под корзины: при добавлении в корзину товар бронируется на STOCK_HOLD_TTL секунд,
+# при оформлении бронь превращается в продажу; просроченные брони снимает фоновая задача
+# каждые STOCK_HOLD_SWEEP_INTERVAL секунд пачками по STOCK_HOLD_SWEEP_BATCH_SIZE
+STOCK_HOLDS_ENABLED = os.getenv("STOCK_HOLDS_ENABLED", "false").lower() in ("1", "true", "yes")
+STOCK_HOLD_TTL = int(os.getenv("STOCK_HOLD_TTL", "900"))
+STOCK_HOLD_SWEEP_INTERVAL = float(os.getenv("STOCK_HOLD_SWEEP_INTERVAL", "60"))
+STOCK_HOLD_SWEEP_BATCH_SIZE = int(os.getenv("STOCK_HOLD_SWEEP_BATCH_SIZE", "1000"))
+
+# Слоты остатка для «горячих» товаров: максимум слотов на товар и как часто (в секундах)
+# сумма слотов переносится в products.stock
+STOCK_SLOTS_MAX = int(os.getenv("STOCK_SLOTS_MAX", "64"))
+STOCK_SLOTS_SYNC_INTERVAL = float(os.getenv("STOCK_SLOTS_SYNC_INTERVAL", "5"))
+# Списание из слотов не видит брони (products.reserved), поэтому вместе с бронями слоты выключены:
+# включить их нельзя, а оставшиеся фоновая задача складывает обратно в products.stock
+STOCK_SLOTS_ENABLED = not STOCK_HOLDS_ENABLED
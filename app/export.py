@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from sqlalchemy import select
+from app.config import EXPORT_BATCH_SIZE
+from app.database import async_session_maker
+from app.models.products import Product as ProductModel
+from app.schemas import Review as ReviewSchema
+
+# Поля выгрузки совпадают с публичной схемой товара
+EXPORT_COLUMNS = (
+    ProductModel.id,
+    ProductModel.name,
+    ProductModel.description,
+    ProductModel.price,
+    ProductModel.image_url,
+    ProductModel.stock,
+    ProductModel.category_id,
+    ProductModel.is_active,
+)
+EXPORT_FIELDS = tuple(column.key for column in EXPORT_COLUMNS)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+async def stream_products(filters: list, fmt: str) -> AsyncIterator[str]:
+    """
+    Отдаёт товары по фильтрам порциями текста в формате NDJSON или CSV.
+    Строки читаются серверным курсором по EXPORT_BATCH_SIZE штук, поэтому память
+    не зависит от размера каталога. Сессия своя: генератор работает уже после того,
+    как обработчик запроса вернул ответ.
+    """
+    stmt = (
+        select(*EXPORT_COLUMNS)
+        .where(*filters)
+        .order_by(ProductModel.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    if fmt == "csv":
+        yield _csv_lines([EXPORT_FIELDS])
+
+    async with async_session_maker() as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            if fmt == "csv":
+                yield _csv_lines(rows)
+            else:
+                yield "".join(_ndjson_line(row) for row in rows)
+
+async def stream_reviews(stmt) -> AsyncIterator[str]:
+    """
+    Отдаёт отзывы упорядоченной выборки stmt в NDJSON по схеме Review.
+    Как и выгрузка товаров, читает серверным курсором по EXPORT_BATCH_SIZE штук в своей сессии.
+    """
+    async with async_session_maker() as session:
+        result = await session.stream_scalars(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for reviews in result.partitions():
+            yield "".join(ReviewSchema.model_validate(review).model_dump_json() + "\n" for review in reviews)
+
+def _ndjson_line(row) -> str:
+    item = row._asdict()
+    # Цена отдаётся строкой, как и в JSON-ответах API, чтобы не терять точность Decimal
+    item["price"] = str(item["price"])
+    return json.dumps(item, ensure_ascii=False) + "\n"
+
+def _csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
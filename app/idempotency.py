@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections.abc import Callable
+import jwt
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from app.config import (
+    SECRET_KEY,
+    ALGORITHM,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_LOCK_TTL,
+    IDEMPOTENCY_WAIT_TIMEOUT,
+    IDEMPOTENCY_POLL_INTERVAL,
+)
+from app.redis_client import get_redis
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+class IdempotentRoute(APIRoute):
+    """
+    Маршрут с поддержкой заголовка Idempotency-Key для изменяющих запросов.
+
+    Первый запрос с ключом занимает запись в Redis (SET NX с коротким TTL), выполняется
+    и сохраняет статус и тело ответа на IDEMPOTENCY_TTL. Повторы с тем же ключом получают
+    сохранённый ответ без повторного выполнения; параллельные повторы ждут завершения
+    первого запроса. Ответы 5xx и исключения не сохраняются — запись освобождается,
+    чтобы повтор мог выполниться заново. Ключ действует в пределах пользователя из токена,
+    метода и пути; повтор ключа с другим телом запроса отклоняется с 422.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            owner = _token_subject(request) if key else None
+            if request.method not in IDEMPOTENT_METHODS or owner is None:
+                return await handler(request)
+
+            record_key = "idem:" + hashlib.sha256(
+                f"{owner}\n{request.method}\n{request.url.path}\n{key}".encode()
+            ).hexdigest()
+            fingerprint = hashlib.sha256(await request.body()).hexdigest()
+
+            stored = await _acquire(record_key, fingerprint)
+            if stored is not None:
+                return _replay(stored, fingerprint)
+
+            try:
+                response = await handler(request)
+            except HTTPException as exc:
+                if exc.status_code >= 500:
+                    await get_redis().delete(record_key)
+                    raise
+                response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+            except BaseException:
+                await get_redis().delete(record_key)
+                raise
+
+            if response.status_code >= 500:
+                await get_redis().delete(record_key)
+                return response
+            await get_redis().set(record_key, json.dumps({
+                "state": "done",
+                "fingerprint": fingerprint,
+                "status": response.status_code,
+                "media_type": response.media_type,
+                "body": response.body.decode(),
+            }), ex=IDEMPOTENCY_TTL)
+            return response
+
+        return idempotent_handler
+
+def _token_subject(request: Request) -> str | None:
+    """
+    Владелец ключа — sub из access-токена; без валидного токена идемпотентность не применяется
+    (обработчик сам вернёт 401).
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except jwt.PyJWTError:
+        return None
+
+async def _acquire(record_key: str, fingerprint: str) -> dict | None:
+    """
+    Занимает запись ключа и возвращает None, если запрос нужно выполнить,
+    либо сохранённый результат первого запроса (дожидаясь его, если он ещё выполняется).
+    """
+    redis = get_redis()
+    in_flight = json.dumps({"state": "in_flight", "fingerprint": fingerprint})
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        if await redis.set(record_key, in_flight, ex=IDEMPOTENCY_LOCK_TTL, nx=True):
+            return None
+        value = await redis.get(record_key)
+        if value is not None:
+            stored = json.loads(value)
+            if stored["state"] == "done" or stored["fingerprint"] != fingerprint:
+                return stored
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+def _replay(stored: dict, fingerprint: str) -> Response:
+    if stored["fingerprint"] != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    return Response(
+        content=stored["body"],
+        status_code=stored["status"],
+        media_type=stored["media_type"],
+        headers={REPLAYED_HEADER: "true"},
+    )
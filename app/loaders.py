@@ -0,0 +1,97 @@
+from collections.abc import Iterable
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db_depends import get_async_db
+from app.models.categories import Category as CategoryModel
+from app.models.products import Product as ProductModel
+
+class CatalogLoader:
+    """
+    Загрузчик товаров и категорий в пределах одного запроса (одной сессии).
+    Запоминает прочитанные строки, включая отсутствующие, и догружает недостающие
+    одним запросом с IN, поэтому одна строка за запрос читается не больше одного раза.
+    Товары читаются вместе со своими категориями одним JOIN.
+    Активность не фильтруется: проверка is_active остаётся за вызывающим кодом.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self._products: dict[int, ProductModel | None] = {}
+        self._categories: dict[int, CategoryModel | None] = {}
+
+    @classmethod
+    def for_session(cls, db: AsyncSession) -> "CatalogLoader":
+        """
+        Возвращает загрузчик, привязанный к сессии, создавая его при первом обращении.
+        """
+        loader = db.info.get("catalog_loader")
+        if loader is None:
+            loader = db.info["catalog_loader"] = cls(db)
+        return loader
+
+    async def load_products(self, ids: Iterable[int]) -> dict[int, ProductModel | None]:
+        ids = list(ids)
+        missing = {product_id for product_id in ids if product_id not in self._products}
+        if missing:
+            result = await self.db.execute(
+                select(ProductModel, CategoryModel)
+                .outerjoin(CategoryModel, CategoryModel.id == ProductModel.category_id)
+                .where(ProductModel.id.in_(missing))
+            )
+            for product, category in result:
+                self._products[product.id] = product
+                self._categories[product.category_id] = category
+            for product_id in missing:
+                self._products.setdefault(product_id, None)
+        return {product_id: self._products[product_id] for product_id in ids}
+
+    async def load_categories(self, ids: Iterable[int]) -> dict[int, CategoryModel | None]:
+        ids = list(ids)
+        missing = {category_id for category_id in ids if category_id not in self._categories}
+        if missing:
+            result = await self.db.scalars(select(CategoryModel).where(CategoryModel.id.in_(missing)))
+            for category in result:
+                self._categories[category.id] = category
+            for category_id in missing:
+                self._categories.setdefault(category_id, None)
+        return {category_id: self._categories[category_id] for category_id in ids}
+
+    async def get_product(self, product_id: int) -> ProductModel | None:
+        return (await self.load_products([product_id]))[product_id]
+
+    async def get_category(self, category_id: int) -> CategoryModel | None:
+        return (await self.load_categories([category_id]))[category_id]
+
+    async def get_product_and_category(
+        self, product_id: int, category_id: int | None = None
+    ) -> tuple[ProductModel | None, CategoryModel | None]:
+        """
+        Товар и категорию за один запрос: собственную категорию товара
+        или, если передан category_id, указанную (например, новую категорию при обновлении).
+        """
+        if category_id is None or category_id in self._categories:
+            product = await self.get_product(product_id)
+            if product is None:
+                return None, None
+            return product, await self.get_category(category_id or product.category_id)
+
+        result = await self.db.execute(
+            select(ProductModel, CategoryModel)
+            .outerjoin(CategoryModel, CategoryModel.id == category_id)
+            .where(ProductModel.id == product_id)
+        )
+        row = result.first()
+        if row is None:
+            self._products[product_id] = None
+            return None, None
+        product, category = row
+        self._products[product_id] = product
+        self._categories[category_id] = category
+        return product, category
+
+async def get_catalog_loader(db: AsyncSession = Depends(get_async_db)) -> CatalogLoader:
+    """
+    Зависимость FastAPI: загрузчик каталога для сессии текущего запроса.
+    """
+    return CatalogLoader.for_session(db)
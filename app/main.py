@@ -1,6 +1,7 @@
 from fastapi import FastAPI
-from celery import Celery
 from app.routers import categories, products, users, reviews, cart, orders
+from app.metrics import metrics_response
+from app.celery_app import celery  # noqa: F401 — воркер запускается как `celery -A app.main worker`
 
 # Создаём приложение FastAPI
 app = FastAPI(
@@ -8,14 +9,6 @@ app = FastAPI(
     version="0.1.0",
 )
 
-celery = Celery(
-    __name__,
-    broker='redis://127.0.0.1:6379/0',
-    backend='redis://127.0.0.1:6379/0',
-    broker_connection_retry_on_startup=True,
-    include=['app.celery_task']
-)
-
 # app_v1 = FastAPI(
 # title="My API v1",
 # description="The first version of my API",
@@ -53,3 +46,10 @@ async def root():
     Корневой маршрут, подтверждающий, что API работает.
     """
     return {"message": "Добро пожаловать в API интернет-магазина!"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики Prometheus: пул хеширования паролей и метрики процесса.
+    """
+    return metrics_response()
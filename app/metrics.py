@@ -0,0 +1,29 @@
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Пул хеширования паролей (app/password_hashing.py)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_pool_wait_seconds",
+    "Время ожидания свободного потока пула хеширования паролей",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "Время вычисления bcrypt",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+PASSWORD_HASH_PENDING = Gauge(
+    "password_hash_pool_pending",
+    "Операции с паролями, выполняющиеся или ожидающие в пуле",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_pool_rejected_total",
+    "Операции с паролями, отклонённые из-за переполненной очереди пула",
+)
+
+def metrics_response() -> Response:
+    """
+    Текущие метрики процесса в текстовом формате Prometheus.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
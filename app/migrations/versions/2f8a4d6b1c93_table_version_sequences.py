@@ -0,0 +1,33 @@
+"""table version sequences
+
+Revision ID: 2f8a4d6b1c93
+Revises: 9b3f6c1d8e27
+Create Date: 2026-02-09 10:05:17.264391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8a4d6b1c93'
+down_revision: Union[str, Sequence[str], None] = '9b3f6c1d8e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('products', 'categories', 'reviews')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Счётчики версий для ETag списков (см. app/versions.py)
+    for table in TABLES:
+        op.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_version_seq")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.execute(f"DROP SEQUENCE IF EXISTS {table}_version_seq")
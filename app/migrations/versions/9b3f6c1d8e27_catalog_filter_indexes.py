@@ -0,0 +1,48 @@
+"""catalog filter indexes
+
+Revision ID: 9b3f6c1d8e27
+Revises: 5d1e7a9c2b40
+Create Date: 2026-02-05 16:42:09.830514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3f6c1d8e27'
+down_revision: Union[str, Sequence[str], None] = '5d1e7a9c2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, колонки, условие частичного индекса)
+INDEXES = [
+    ('ix_products_active_category_id', ['category_id', 'id'], 'is_active'),
+    ('ix_products_active_category_price', ['category_id', 'price'], 'is_active'),
+    ('ix_products_active_seller_id', ['seller_id', 'id'], 'is_active'),
+    ('ix_products_active_price', ['price'], 'is_active'),
+    ('ix_products_active_created_at', ['created_at'], 'is_active'),
+    ('ix_products_active_in_stock', ['id'], 'is_active AND stock > 0'),
+    ('ix_products_active_out_of_stock', ['id'], 'is_active AND stock = 0'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в products, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name, 'products', columns, unique=False,
+                postgresql_where=sa.text(where), postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products', postgresql_concurrently=True, if_exists=True)
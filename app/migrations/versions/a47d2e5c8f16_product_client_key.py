@@ -0,0 +1,33 @@
+"""product client key
+
+Revision ID: a47d2e5c8f16
+Revises: 6c1e9f3a7d52
+Create Date: 2026-02-13 12:18:44.902157
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a47d2e5c8f16'
+down_revision: Union[str, Sequence[str], None] = '6c1e9f3a7d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('client_key', sa.String(length=100), nullable=True))
+    op.create_index(
+        'uq_products_seller_client_key', 'products', ['seller_id', 'client_key'],
+        unique=True, postgresql_where=sa.text('client_key IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_products_seller_client_key', table_name='products', postgresql_where=sa.text('client_key IS NOT NULL'))
+    op.drop_column('products', 'client_key')
@@ -0,0 +1,48 @@
+"""product rating aggregates
+
+Revision ID: a8c4e2f6b913
+Revises: f2b6d8e4a157
+Create Date: 2026-02-25 12:08:31.470952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c4e2f6b913'
+down_revision: Union[str, Sequence[str], None] = 'f2b6d8e4a157'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('products', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    # Заполнение счётчиков по уже существующим активным отзывам одним проходом по reviews
+    op.execute(
+        """
+        UPDATE products AS p
+        SET rating_sum = r.rating_sum, rating_count = r.rating_count
+        FROM (
+            SELECT product_id, sum(grade) AS rating_sum, count(*) AS rating_count
+            FROM reviews
+            WHERE is_active
+            GROUP BY product_id
+        ) AS r
+        WHERE p.id = r.product_id
+        """
+    )
+    op.create_check_constraint(
+        'ck_products_rating_non_negative', 'products', 'rating_count >= 0 AND rating_sum >= 0'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ck_products_rating_non_negative', 'products', type_='check')
+    op.drop_column('products', 'rating_count')
+    op.drop_column('products', 'rating_sum')
@@ -0,0 +1,53 @@
+"""product rating histograms
+
+Revision ID: b5d9f3a7c264
+Revises: a8c4e2f6b913
+Create Date: 2026-02-26 09:52:14.631087
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d9f3a7c264'
+down_revision: Union[str, Sequence[str], None] = 'a8c4e2f6b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_rating_histograms',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('grade_1', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_2', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_3', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_4', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('grade_5', sa.Integer(), server_default='0', nullable=False),
+    sa.CheckConstraint('grade_1 >= 0 AND grade_2 >= 0 AND grade_3 >= 0 AND grade_4 >= 0 AND grade_5 >= 0', name='ck_product_rating_histograms_non_negative'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    # Заполнение по уже существующим активным отзывам одним проходом по reviews
+    op.execute(
+        """
+        INSERT INTO product_rating_histograms (product_id, grade_1, grade_2, grade_3, grade_4, grade_5)
+        SELECT product_id,
+               count(*) FILTER (WHERE grade = 1),
+               count(*) FILTER (WHERE grade = 2),
+               count(*) FILTER (WHERE grade = 3),
+               count(*) FILTER (WHERE grade = 4),
+               count(*) FILTER (WHERE grade = 5)
+        FROM reviews
+        WHERE is_active
+        GROUP BY product_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_rating_histograms')
@@ -0,0 +1,40 @@
+"""order history summary
+
+Revision ID: c3b8e1f4a925
+Revises: a47d2e5c8f16
+Create Date: 2026-02-16 09:37:52.184406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3b8e1f4a925'
+down_revision: Union[str, Sequence[str], None] = 'a47d2e5c8f16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Снимок названия товара: добавляем, заполняем по текущим товарам, затем запрещаем NULL
+    op.add_column('order_items', sa.Column('product_name', sa.String(length=100), nullable=True))
+    op.execute(
+        "UPDATE order_items SET product_name = products.name "
+        "FROM products WHERE products.id = order_items.product_id"
+    )
+    op.alter_column('order_items', 'product_name', nullable=False)
+
+    op.create_index(
+        'ix_orders_user_created_at_id', 'orders',
+        ['user_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_created_at_id', table_name='orders')
+    op.drop_column('order_items', 'product_name')
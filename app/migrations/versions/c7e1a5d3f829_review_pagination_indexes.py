@@ -0,0 +1,45 @@
+"""review pagination indexes
+
+Revision ID: c7e1a5d3f829
+Revises: b5d9f3a7c264
+Create Date: 2026-02-27 14:26:40.518392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e1a5d3f829'
+down_revision: Union[str, Sequence[str], None] = 'b5d9f3a7c264'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, колонки, условие частичного индекса) — под курсорные выборки отзывов
+INDEXES = [
+    ('ix_reviews_active_product_date', ['product_id', 'comment_date', 'id'], 'is_active'),
+    ('ix_reviews_active_product_grade', ['product_id', 'grade', 'comment_date', 'id'], 'is_active'),
+    ('ix_reviews_active_date', ['comment_date', 'id'], 'is_active'),
+    ('ix_reviews_active_grade', ['grade', 'comment_date', 'id'], 'is_active'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в reviews, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name, 'reviews', columns, unique=False,
+                postgresql_where=sa.text(where), postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='reviews', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,43 @@
+"""product availability indexes
+
+Revision ID: d4b8f2c6a917
+Revises: c7e1a5d3f829
+Create Date: 2026-03-02 11:17:45.902613
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b8f2c6a917'
+down_revision: Union[str, Sequence[str], None] = 'c7e1a5d3f829'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя индекса, колонки, условие частичного индекса) — фильтр in_stock при включённых бронях
+INDEXES = [
+    ('ix_products_active_available', ['id'], 'is_active AND stock > reserved'),
+    ('ix_products_active_unavailable', ['id'], 'is_active AND stock <= reserved'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в products, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name, 'products', columns, unique=False,
+                postgresql_where=sa.text(where), postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='products', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,48 @@
+"""stock holds
+
+Revision ID: d91f2a6c4b38
+Revises: c3b8e1f4a925
+Create Date: 2026-02-18 11:04:27.531902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91f2a6c4b38'
+down_revision: Union[str, Sequence[str], None] = 'c3b8e1f4a925'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('reserved', sa.Integer(), server_default='0', nullable=False))
+    op.create_check_constraint('ck_products_reserved_non_negative', 'products', 'reserved >= 0')
+
+    op.create_table('stock_holds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'product_id', name='uq_stock_holds_user_product')
+    )
+    op.create_index(op.f('ix_stock_holds_product_id'), 'stock_holds', ['product_id'], unique=False)
+    op.create_index(op.f('ix_stock_holds_expires_at'), 'stock_holds', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stock_holds_expires_at'), table_name='stock_holds')
+    op.drop_index(op.f('ix_stock_holds_product_id'), table_name='stock_holds')
+    op.drop_table('stock_holds')
+    op.drop_constraint('ck_products_reserved_non_negative', 'products', type_='check')
+    op.drop_column('products', 'reserved')
@@ -0,0 +1,37 @@
+"""product stock slots
+
+Revision ID: e5a7c3d9f261
+Revises: d91f2a6c4b38
+Create Date: 2026-02-20 15:12:08.740316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c3d9f261'
+down_revision: Union[str, Sequence[str], None] = 'd91f2a6c4b38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('stock_slots', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('product_stock_slots',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.CheckConstraint('stock >= 0', name='ck_product_stock_slots_stock_non_negative'),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'slot')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('product_stock_slots')
+    op.drop_column('products', 'stock_slots')
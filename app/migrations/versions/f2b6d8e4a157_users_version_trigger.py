@@ -0,0 +1,65 @@
+"""users version trigger
+
+Revision ID: f2b6d8e4a157
+Revises: e5a7c3d9f261
+Create Date: 2026-02-23 10:41:55.208163
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8e4a157'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c3d9f261'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Версия пользователей для кэша аутентифицированных пользователей (app/principal_cache.py).
+    # Триггер увеличивает её при смене роли, блокировке или удалении пользователя любым путём,
+    # включая ручные правки в БД; отложенный триггер срабатывает при commit изменившей транзакции
+    op.execute("CREATE SEQUENCE IF NOT EXISTS users_version_seq")
+    op.execute(
+        """
+        CREATE FUNCTION bump_users_version() RETURNS trigger AS $$
+        BEGIN
+            PERFORM nextval('users_version_seq');
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER users_principal_changed
+        AFTER UPDATE ON users
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW
+        WHEN (OLD.role IS DISTINCT FROM NEW.role
+              OR OLD.is_active IS DISTINCT FROM NEW.is_active
+              OR OLD.email IS DISTINCT FROM NEW.email)
+        EXECUTE FUNCTION bump_users_version()
+        """
+    )
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER users_principal_deleted
+        AFTER DELETE ON users
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW
+        EXECUTE FUNCTION bump_users_version()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS users_principal_deleted ON users")
+    op.execute("DROP TRIGGER IF EXISTS users_principal_changed ON users")
+    op.execute("DROP FUNCTION IF EXISTS bump_users_version()")
+    op.execute("DROP SEQUENCE IF EXISTS users_version_seq")
@@ -1,8 +1,11 @@
-from app.models.categories import Category
+from app.models.categories import Category, CategoryClosure
 from app.models.products import Product
 from app.models.users import User
 from app.models.reviews import Review
 from app.models.cart_items import CartItem
 from app.models.orders import Order, OrderItem
+from app.models.stock_holds import StockHold
+from app.models.stock_slots import ProductStockSlot
+from app.models.rating_histograms import ProductRatingHistogram
 
-__all__ = ["Category", "Product", "User", "Review", "CartItem", "OrderItem", "Order"]
\ No newline at end of file
+__all__ = ["Category", "CategoryClosure", "Product", "User", "Review", "CartItem", "OrderItem", "Order", "StockHold", "ProductStockSlot", "ProductRatingHistogram"]
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Boolean, ForeignKey
+from sqlalchemy import String, Boolean, ForeignKey, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 from typing import TYPE_CHECKING
@@ -21,6 +21,18 @@ class Category(Base):
 
     children: Mapped[list["Category"]] = relationship("Category", back_populates="parent")
 
+class CategoryClosure(Base):
+    """
+    Таблица замыкания иерархии категорий: строка на каждую пару "предок — потомок",
+    включая саму категорию (depth = 0). Позволяет выбрать всё поддерево одним индексным
+    запросом без рекурсии. Поддерево мягко удалённой категории отвязывается от её предков.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id: Mapped[int] = mapped_column(ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True, index=True)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
 # if __name__ == "__main__":
 #     from sqlalchemy.schema import CreateTable
 #     print(CreateTable(Category.__table__))
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import DateTime, ForeignKey, Integer, UniqueConstraint, func, String, Numeric
+from sqlalchemy import DateTime, ForeignKey, Integer, UniqueConstraint, func, String, Numeric, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 from decimal import Decimal
@@ -12,6 +12,11 @@ if TYPE_CHECKING:
 class Order(Base):
     __tablename__ = "orders"
 
+    __table_args__ = (
+        # История заказов пользователя: новые сверху, keyset-пагинация по (created_at, id)
+        Index("ix_orders_user_created_at_id", "user_id", text("created_at DESC"), text("id DESC")),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)
@@ -28,6 +33,8 @@ class OrderItem(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     order_id: Mapped[int] = mapped_column(ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False, index=True)
+    # Название товара на момент покупки: детали заказа не читают products
+    product_name: Mapped[str] = mapped_column(String(100), nullable=False)
     quantity: Mapped[int] = mapped_column(Integer, nullable=False)
     unit_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     total_price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
@@ -1,6 +1,7 @@
 from decimal import Decimal
-from sqlalchemy import String, Boolean, Integer, Numeric, ForeignKey, func, DateTime, Computed, Index
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Integer, Numeric, Float, ForeignKey, func, DateTime, Computed, Index, CheckConstraint, text, case, cast
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column, relationship, column_property
 from app.database import Base
 from datetime import datetime
 from typing import TYPE_CHECKING
@@ -12,18 +13,68 @@ if TYPE_CHECKING:
     from .cart_items import CartItem
     from .orders import OrderItem
 
+# Конфигурация текстового поиска: 'simple' не зависит от языка названия товара
+SEARCH_TS_CONFIG = "simple"
+
 class Product(Base):
     __tablename__ = "products"
 
+    __table_args__ = (
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        # Частичные индексы под фильтры каталога: все выборки идут только по активным товарам
+        Index("ix_products_active_category_id", "category_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_category_price", "category_id", "price", postgresql_where=text("is_active")),
+        Index("ix_products_active_seller_id", "seller_id", "id", postgresql_where=text("is_active")),
+        Index("ix_products_active_price", "price", postgresql_where=text("is_active")),
+        Index("ix_products_active_created_at", "created_at", postgresql_where=text("is_active")),
+        Index("ix_products_active_in_stock", "id", postgresql_where=text("is_active AND stock > 0")),
+        Index("ix_products_active_out_of_stock", "id", postgresql_where=text("is_active AND stock = 0")),
+        # Те же фильтры наличия при включённых бронях: доступно stock - reserved
+        Index("ix_products_active_available", "id", postgresql_where=text("is_active AND stock > reserved")),
+        Index("ix_products_active_unavailable", "id", postgresql_where=text("is_active AND stock <= reserved")),
+        # Ключ товара в системе продавца уникален в пределах продавца (цель ON CONFLICT массовой загрузки)
+        Index("uq_products_seller_client_key", "seller_id", "client_key", unique=True,
+              postgresql_where=text("client_key IS NOT NULL")),
+        CheckConstraint("reserved >= 0", name="ck_products_reserved_non_negative"),
+        CheckConstraint("rating_count >= 0 AND rating_sum >= 0", name="ck_products_rating_non_negative"),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str | None] = mapped_column(String(500), nullable=True)
     price: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
     image_url: Mapped[str | None] = mapped_column(String(200), nullable=True)
     stock: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Сколько из stock занято бронями корзин (stock_holds); доступно к покупке stock - reserved
+    reserved: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # 0 — остаток только в stock; N > 0 — остаток разложен по N строкам product_stock_slots,
+    # а stock — их сумма, которую периодически обновляет фоновая задача
+    stock_slots: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # Сумма и количество оценок активных отзывов; меняются в транзакции создания и удаления отзыва
+    rating_sum: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    rating_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # Средняя оценка считается из счётчиков при чтении, без сканирования отзывов
+    rating: Mapped[float] = column_property(
+        cast(
+            func.round(case((rating_count > 0, cast(rating_sum, Numeric) / rating_count), else_=0), 2),
+            Float,
+        ).label("rating")
+    )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    client_key: Mapped[str | None] = mapped_column(String(100), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Поисковый вектор считается самой БД; в обычные выборки не загружается
+    search_vector: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(name, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
 
     seller_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), nullable=False)
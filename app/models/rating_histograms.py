@@ -0,0 +1,30 @@
+from sqlalchemy import ForeignKey, Integer, CheckConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+# Допустимые оценки отзыва (check_grade_range в reviews)
+GRADES = (1, 2, 3, 4, 5)
+
+class ProductRatingHistogram(Base):
+    """
+    Распределение оценок активных отзывов товара: по счётчику на каждую оценку 1–5.
+    Строка создаётся первым отзывом и меняется в транзакции создания и удаления отзыва.
+    """
+    __tablename__ = "product_rating_histograms"
+
+    __table_args__ = (
+        CheckConstraint(
+            " AND ".join(f"grade_{grade} >= 0" for grade in GRADES),
+            name="ck_product_rating_histograms_non_negative",
+        ),
+    )
+
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    grade_1: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    grade_2: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    grade_3: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    grade_4: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    grade_5: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
+    def counts(self) -> dict[int, int]:
+        return {grade: getattr(self, f"grade_{grade}") for grade in GRADES}
@@ -1,5 +1,5 @@
 from app.database import Base
-from sqlalchemy import Integer, ForeignKey, Text, TIMESTAMP, CheckConstraint, Boolean, text, Float
+from sqlalchemy import Integer, ForeignKey, Text, TIMESTAMP, CheckConstraint, Boolean, Index, text, Float
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import TYPE_CHECKING
 from datetime import datetime
@@ -12,6 +12,13 @@ class Review(Base):
     __tablename__ = "reviews"
     __table_args__ = (
         CheckConstraint("grade >= 1 AND grade <= 5", name="check_grade_range"),
+        # Курсорные выборки активных отзывов: новые сначала и по убыванию оценки,
+        # для товара и по всем отзывам (индексы читаются в обратном порядке)
+        Index("ix_reviews_active_product_date", "product_id", "comment_date", "id", postgresql_where=text("is_active")),
+        Index("ix_reviews_active_product_grade", "product_id", "grade", "comment_date", "id",
+              postgresql_where=text("is_active")),
+        Index("ix_reviews_active_date", "comment_date", "id", postgresql_where=text("is_active")),
+        Index("ix_reviews_active_grade", "grade", "comment_date", "id", postgresql_where=text("is_active")),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -0,0 +1,22 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+class StockHold(Base):
+    """
+    Временная бронь остатка товара под корзину пользователя (режим STOCK_HOLDS_ENABLED).
+    Сумма броней товара хранится в products.reserved; просроченные брони снимает фоновая задача.
+    """
+    __tablename__ = "stock_holds"
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "product_id", name="uq_stock_holds_user_product"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
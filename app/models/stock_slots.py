@@ -0,0 +1,19 @@
+from sqlalchemy import ForeignKey, Integer, CheckConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+class ProductStockSlot(Base):
+    """
+    Слот остатка товара в режиме products.stock_slots > 0: остаток разложен по N строкам,
+    чтобы параллельные заказы списывали его из разных строк, не дожидаясь друг друга.
+    Сумма слотов периодически переносится в products.stock.
+    """
+    __tablename__ = "product_stock_slots"
+
+    __table_args__ = (
+        CheckConstraint("stock >= 0", name="ck_product_stock_slots_stock_non_negative"),
+    )
+
+    product_id: Mapped[int] = mapped_column(ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    slot: Mapped[int] = mapped_column(Integer, primary_key=True)
+    stock: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -0,0 +1,221 @@
+import asyncio
+import itertools
+import logging
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from collections.abc import Iterable
+from celery.exceptions import Retry
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.celery_app import celery, run_async
+from app.config import PAYMENT_STUB_MODE, ORDER_TASK_MAX_RETRIES, ORDER_PENDING_RESUME_AFTER
+from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.products import Product as ProductModel
+from app.models.stock_slots import ProductStockSlot
+from app.redis_client import make_redis
+from app.utils import _invalidate_products
+
+logger = logging.getLogger(__name__)
+
+# Допустимые переходы статуса заказа: pending → paid → fulfilled, отмена — из pending или paid
+ORDER_TRANSITIONS = {
+    "pending": {"paid", "cancelled"},
+    "paid": {"fulfilled", "cancelled"},
+    "fulfilled": set(),
+    "cancelled": set(),
+}
+
+class PaymentTemporaryError(Exception):
+    """Временная ошибка платёжного шлюза: шаг нужно повторить позже."""
+
+class PaymentGatewayStub:
+    """
+    Локальная заглушка платёжного шлюза. Идентификатор заказа служит ключом идемпотентности
+    платежа, поэтому повторное подтверждение того же заказа безопасно.
+    """
+
+    def __init__(self, mode: str = PAYMENT_STUB_MODE):
+        self.mode = mode
+        self._attempts = itertools.count()
+
+    async def confirm(self, order_id: int, amount: Decimal) -> bool:
+        if self.mode == "flaky" and next(self._attempts) % 2 == 0:
+            raise PaymentTemporaryError(f"Gateway timeout for order {order_id}")
+        return self.mode != "decline"
+
+payment_gateway = PaymentGatewayStub()
+
+async def _transition(
+    db: AsyncSession, order_id: int, to_status: str, from_statuses: Iterable[str] | None = None
+) -> bool:
+    """
+    Переводит заказ в to_status условным UPDATE ... WHERE status IN (допустимые исходные).
+    Исходные статусы по умолчанию берутся из ORDER_TRANSITIONS; from_statuses сужает их
+    для конкретного шага. Возвращает False, если заказ уже в другом статусе: повтор шага
+    ничего не меняет. Commit — за вызывающим кодом.
+    """
+    sources = [status for status, targets in ORDER_TRANSITIONS.items() if to_status in targets]
+    if from_statuses is not None:
+        sources = [status for status in sources if status in from_statuses]
+    changed = await db.scalar(
+        update(OrderModel)
+        .where(OrderModel.id == order_id, OrderModel.status.in_(sources))
+        .values(status=to_status)
+        .returning(OrderModel.id)
+    )
+    return changed is not None
+
+async def _current_status(db: AsyncSession, order_id: int) -> str:
+    return await db.scalar(select(OrderModel.status).where(OrderModel.id == order_id)) or "missing"
+
+async def _confirm_payment(db: AsyncSession, order_id: int) -> str:
+    order = await db.get(OrderModel, order_id)
+    if order is None or order.status != "pending":
+        return order.status if order else "missing"
+
+    approved = await payment_gateway.confirm(order.id, order.total_amount)
+    to_status = "paid" if approved else "cancelled"
+    # Итог оплаты применяется только к заказу, который всё ещё ждёт оплаты: дубль задачи
+    # с отказом не отменит заказ, уже оплаченный другой задачей
+    moved = await _transition(db, order_id, to_status, from_statuses=("pending",))
+    released = []
+    if moved and not approved:
+        released = await _release_stock(db, order_id)
+    await db.commit()
+    if released:
+        # Остатки вернулись в продажу: новый ETag списков и сброс кэшей каталога.
+        # Клиент redis.asyncio привязан к event loop задачи, поэтому свой
+        redis = make_redis()
+        try:
+            await _invalidate_products(db, released, redis)
+        finally:
+            await redis.aclose()
+    return to_status if moved else await _current_status(db, order_id)
+
+async def _release_stock(db: AsyncSession, order_id: int) -> list[int]:
+    """
+    Возвращает на склад остатки отменённого заказа. Выполняется в одной транзакции
+    с переводом в cancelled, поэтому не повторяется. Товарам со слотами остаток
+    возвращается в нулевой слот, в products.stock его перенесёт синхронизация.
+    Возвращает id товаров, чей остаток изменился.
+    """
+    products = await db.scalars(
+        update(ProductModel)
+        .where(
+            ProductModel.id == OrderItemModel.product_id,
+            OrderItemModel.order_id == order_id,
+            ProductModel.stock_slots == 0,
+        )
+        .values(stock=ProductModel.stock + OrderItemModel.quantity)
+        .returning(ProductModel.id)
+        .execution_options(synchronize_session=False)
+    )
+    product_ids = products.all()
+    slots = await db.scalars(
+        update(ProductStockSlot)
+        .where(
+            ProductStockSlot.product_id == OrderItemModel.product_id,
+            ProductStockSlot.slot == 0,
+            OrderItemModel.order_id == order_id,
+        )
+        .values(stock=ProductStockSlot.stock + OrderItemModel.quantity)
+        .returning(ProductStockSlot.product_id)
+        .execution_options(synchronize_session=False)
+    )
+    return product_ids + slots.all()
+
+async def _fulfill(db: AsyncSession, order_id: int) -> str:
+    # Остатки списаны ещё при оформлении, здесь списание становится окончательным
+    moved = await _transition(db, order_id, "fulfilled")
+    await db.commit()
+    return "fulfilled" if moved else await _current_status(db, order_id)
+
+async def _stale_pending_orders(db: AsyncSession, older_than: int) -> list[int]:
+    threshold = datetime.now(timezone.utc) - timedelta(seconds=older_than)
+    result = await db.scalars(
+        select(OrderModel.id)
+        .where(OrderModel.status == "pending", OrderModel.updated_at < threshold)
+        .order_by(OrderModel.id)
+        .limit(1000)
+    )
+    return result.all()
+
+@celery.task(
+    bind=True,
+    autoretry_for=(PaymentTemporaryError, DBAPIError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=ORDER_TASK_MAX_RETRIES,
+)
+def confirm_payment(self, order_id: int) -> str:
+    """
+    Подтверждает оплату заказа в статусе pending: paid → дальше fulfill_order,
+    отказ → cancelled с возвратом остатков. Для заказа в другом статусе ничего не делает.
+    """
+    logger.info("order %s: confirming payment (task %s, attempt %s)", order_id, self.request.id, self.request.retries + 1)
+    status = run_async(_confirm_payment, order_id)
+    logger.info("order %s: payment step finished with status %s", order_id, status)
+    if status == "paid":
+        fulfill_order.delay(order_id)
+    if status in ("paid", "cancelled"):
+        notify_order.delay(order_id, status)
+    return status
+
+@celery.task(
+    bind=True,
+    autoretry_for=(DBAPIError,),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=ORDER_TASK_MAX_RETRIES,
+)
+def fulfill_order(self, order_id: int) -> str:
+    """
+    Завершает оплаченный заказ (paid → fulfilled). Повторный запуск ничего не меняет.
+    """
+    status = run_async(_fulfill, order_id)
+    logger.info("order %s: fulfillment step finished with status %s (task %s)", order_id, status, self.request.id)
+    if status == "fulfilled":
+        notify_order.delay(order_id, status)
+    return status
+
+@celery.task(
+    bind=True,
+    autoretry_for=(ConnectionError,),
+    retry_backoff=True,
+    max_retries=ORDER_TASK_MAX_RETRIES,
+)
+def notify_order(self, order_id: int, status: str) -> None:
+    """
+    Уведомляет покупателя о смене статуса заказа (заглушка: запись в лог).
+    """
+    logger.info("order %s: notification sent, status %s (task %s)", order_id, status, self.request.id)
+
+@celery.task
+def resume_pending_orders() -> int:
+    """
+    Заново ставит в очередь заказы, которые слишком долго остаются в pending
+    (например, если постановка в очередь после checkout не удалась).
+    """
+    order_ids = run_async(_stale_pending_orders, ORDER_PENDING_RESUME_AFTER)
+    for order_id in order_ids:
+        confirm_payment.delay(order_id)
+    if order_ids:
+        logger.warning("resumed %s pending orders", len(order_ids))
+    return len(order_ids)
+
+async def enqueue_order_processing(order_id: int) -> None:
+    """
+    Ставит обработку созданного заказа в очередь; вызывается после commit.
+    Публикация (или выполнение в eager-режиме) идёт в отдельном потоке, чтобы не блокировать
+    event loop. Ошибка брокера не ломает ответ: заказ подберёт resume_pending_orders.
+    """
+    try:
+        await asyncio.to_thread(confirm_payment.delay, order_id)
+    except Retry:
+        # Только в eager-режиме: повтор не выполняется сразу, заказ подберёт resume_pending_orders
+        logger.warning("order %s: payment confirmation postponed", order_id)
+    except Exception:
+        logger.exception("order %s: failed to enqueue processing", order_id)
@@ -0,0 +1,61 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from app.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT
+from app.metrics import PASSWORD_HASH_WAIT, PASSWORD_HASH_DURATION, PASSWORD_HASH_PENDING, PASSWORD_HASH_REJECTED
+
+# Контекст хеширования bcrypt; хеш с другой стоимостью считается устаревшим (needs_update)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в ограниченном пуле потоков, чтобы не блокировать event loop
+    (bcrypt отпускает GIL на время вычисления). Одновременно в пуле — выполняющиеся
+    и ожидающие — не больше queue_limit операций, остальные сразу получают 503.
+    При workers=0 хеширование идёт прямо в event loop, как раньше.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, queue_limit: int = PASSWORD_HASH_QUEUE_LIMIT):
+        self.queue_limit = max(queue_limit, workers)
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash") if workers > 0 else None
+        )
+        self._pending = 0
+
+    async def run(self, operation: str, func, *args):
+        if self._executor is None:
+            return self._measure(operation, func, *args)
+
+        if self._pending >= self.queue_limit:
+            PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations, retry later",
+                headers={"Retry-After": "1"},
+            )
+
+        submitted = time.perf_counter()
+
+        def job():
+            PASSWORD_HASH_WAIT.observe(time.perf_counter() - submitted)
+            return self._measure(operation, func, *args)
+
+        self._pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._pending -= 1
+            PASSWORD_HASH_PENDING.dec()
+
+    @staticmethod
+    def _measure(operation: str, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,125 @@
+import json
+import math
+import time
+from dataclasses import dataclass, asdict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.cache import TTLCache
+from app.config import (
+    PRINCIPAL_CACHE_ENABLED,
+    PRINCIPAL_CACHE_SIZE,
+    PRINCIPAL_CACHE_TTL,
+    PRINCIPAL_CACHE_CHECK_INTERVAL,
+    PRINCIPAL_CACHE_REDIS,
+)
+from app.models.users import User as UserModel
+from app.redis_client import get_redis
+from app.versions import get_versions
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Аутентифицированный пользователь: только поля, нужные проверкам доступа и обработчикам.
+    """
+    id: int
+    email: str
+    role: str
+    is_active: bool
+
+class PrincipalCache:
+    """
+    Кэш активных пользователей по id из токена: LRU с TTL в памяти воркера
+    и, при PRINCIPAL_CACHE_REDIS, общий второй уровень в Redis.
+
+    Смена роли, блокировка или удаление пользователя увеличивают версию "users"
+    (триггер в БД). Воркер сверяет версию не чаще раза в check_interval секунд и при её
+    изменении очищает свой кэш; записи Redis с другой версией не используются.
+
+    Триггер увеличивает версию при commit, но раньше, чем изменение становится видно
+    другим сессиям, поэтому пользователь, загруженный сразу после смены версии, может
+    оказаться старым. Такие записи живут не дольше check_interval, а затем загружаются заново.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = PRINCIPAL_CACHE_SIZE,
+        ttl: float = PRINCIPAL_CACHE_TTL,
+        check_interval: float = PRINCIPAL_CACHE_CHECK_INTERVAL,
+        enabled: bool = PRINCIPAL_CACHE_ENABLED,
+        use_redis: bool = PRINCIPAL_CACHE_REDIS,
+    ):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.enabled = enabled
+        self.use_redis = use_redis
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._version: int | None = None
+        self._checked_at = 0.0
+        self._changed_at = 0.0
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"principal:{user_id}"
+
+    async def get(self, db: AsyncSession, user_id: int) -> Principal | None:
+        """
+        Возвращает активного пользователя с user_id или None, если такого нет.
+        """
+        if not self.enabled:
+            return await _load_principal(db, UserModel.id == user_id)
+
+        version = await self._current_version(db)
+        principal = self._local.get(user_id)
+        if principal is not None:
+            return principal
+
+        if self.use_redis:
+            cached = await get_redis().get(self._key(user_id))
+            if cached is not None:
+                entry = json.loads(cached)
+                ttl = entry.pop("ttl", self.ttl)
+                if entry.pop("version") == version:
+                    principal = Principal(**entry)
+                    self._local.set(user_id, principal, ttl)
+                    return principal
+
+        principal = await _load_principal(db, UserModel.id == user_id)
+        if principal is not None:
+            ttl = self._entry_ttl()
+            self._local.set(user_id, principal, ttl)
+            if self.use_redis:
+                await get_redis().set(
+                    self._key(user_id),
+                    json.dumps({**asdict(principal), "version": version, "ttl": ttl}),
+                    ex=math.ceil(ttl),
+                )
+        return principal
+
+    def _entry_ttl(self) -> float:
+        # Сразу после смены версии загруженная запись может быть старой (см. docstring класса)
+        if time.monotonic() - self._changed_at < self.check_interval:
+            return self.check_interval
+        return self.ttl
+
+    async def _current_version(self, db: AsyncSession) -> int:
+        if self._version is None or time.monotonic() - self._checked_at >= self.check_interval:
+            (version,) = await get_versions(db, "users")
+            if version != self._version:
+                self._local.clear()
+                self._version = version
+                self._changed_at = time.monotonic()
+            self._checked_at = time.monotonic()
+        return self._version
+
+    def clear(self) -> None:
+        self._local.clear()
+        self._version = None
+
+principal_cache = PrincipalCache()
+
+async def _load_principal(db: AsyncSession, condition) -> Principal | None:
+    row = (await db.execute(
+        select(UserModel.id, UserModel.email, UserModel.role, UserModel.is_active)
+        .where(condition, UserModel.is_active == True)
+    )).first()
+    return Principal(id=row.id, email=row.email, role=row.role, is_active=row.is_active) if row else None
@@ -0,0 +1,70 @@
+import json
+from collections.abc import Iterable
+from decimal import Decimal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import PRODUCT_CACHE_TTL
+from app.models.products import Product as ProductModel
+from app.redis_client import get_redis
+
+# Поля товара, которые возвращаются вместе с позициями корзины и заказа (схема Product)
+PRODUCT_SCHEMA_COLUMNS = (
+    ProductModel.id,
+    ProductModel.name,
+    ProductModel.description,
+    ProductModel.price,
+    ProductModel.image_url,
+    ProductModel.stock,
+    ProductModel.rating,
+    ProductModel.category_id,
+    ProductModel.is_active,
+)
+
+def _product_from_row(row) -> dict:
+    return {column.key: getattr(row, column.key) for column in PRODUCT_SCHEMA_COLUMNS}
+
+class ProductCache:
+    """
+    Кэш полей товара (схема Product) в Redis с TTL, общий для всех воркеров.
+    Недостающие товары дочитываются из БД одним запросом с IN.
+    Остаток в кэше может отставать на TTL — окончательная проверка идёт при оформлении заказа.
+    """
+
+    def __init__(self, ttl: int = PRODUCT_CACHE_TTL):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(product_id: int) -> str:
+        return f"product:{product_id}"
+
+    async def get_many(self, db: AsyncSession, product_ids: Iterable[int]) -> dict[int, dict]:
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return {}
+        redis = get_redis()
+        cached = await redis.mget([self._key(product_id) for product_id in product_ids])
+
+        products = {}
+        for product_id, value in zip(product_ids, cached):
+            if value is not None:
+                product = json.loads(value)
+                product["price"] = Decimal(product["price"])
+                products[product_id] = product
+
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            result = await db.execute(select(*PRODUCT_SCHEMA_COLUMNS).where(ProductModel.id.in_(missing)))
+            for row in result:
+                product = products[row.id] = _product_from_row(row)
+                await redis.set(self._key(row.id), json.dumps(product, default=str), ex=self.ttl)
+        return products
+
+    async def get(self, db: AsyncSession, product_id: int) -> dict | None:
+        return (await self.get_many(db, [product_id])).get(product_id)
+
+    async def invalidate(self, product_ids: Iterable[int], redis=None) -> None:
+        keys = [self._key(product_id) for product_id in product_ids]
+        if keys:
+            await (redis or get_redis()).delete(*keys)
+
+product_cache = ProductCache()
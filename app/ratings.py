@@ -0,0 +1,213 @@
+"""
+Счётчики оценок товаров (products.rating_sum / rating_count и product_rating_histograms)
+и их сверка с отзывами.
+
+Проверка расхождений:
+    python -m app.ratings
+Проверка с исправлением счётчиков по активным отзывам:
+    python -m app.ratings --fix
+"""
+import argparse
+import json
+from collections.abc import Iterable
+from sqlalchemy import select, update, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import PRODUCT_RATING_CACHE_TTL
+from app.models.products import Product as ProductModel
+from app.models.reviews import Review as ReviewModel
+from app.models.rating_histograms import ProductRatingHistogram, GRADES
+from app.redis_client import get_redis, cache_generation, set_cached, invalidate_cached
+
+def _grade_column(grade: int):
+    return getattr(ProductRatingHistogram, f"grade_{grade}")
+
+async def add_review_grade(db: AsyncSession, product_id: int, grade: int) -> None:
+    """
+    Учитывает оценку нового отзыва в счётчиках и гистограмме товара. Вызывается в транзакции
+    вставки отзыва, поэтому отзыв и счётчики фиксируются вместе. Commit — за вызывающим кодом.
+    """
+    await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == product_id)
+        .values(rating_sum=ProductModel.rating_sum + grade, rating_count=ProductModel.rating_count + 1)
+    )
+    stmt = pg_insert(ProductRatingHistogram).values(product_id=product_id, **{f"grade_{grade}": 1})
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[ProductRatingHistogram.product_id],
+        set_={f"grade_{grade}": _grade_column(grade) + 1},
+    ))
+
+async def deactivate_review(db: AsyncSession, review_id: int) -> int | None:
+    """
+    Мягко удаляет активный отзыв и вычитает его оценку из счётчиков товара одним запросом,
+    затем из гистограммы. Условие is_active в UPDATE отзыва гарантирует, что при параллельных
+    удалениях оценка вычитается один раз. Строки товара и гистограммы блокируются в том же
+    порядке, что и в add_review_grade. Возвращает id товара или None, если отзыв
+    уже не активен. Commit — за вызывающим кодом.
+    """
+    removed = (
+        update(ReviewModel)
+        .where(ReviewModel.id == review_id, ReviewModel.is_active == True)
+        .values(is_active=False)
+        .returning(ReviewModel.product_id, ReviewModel.grade)
+        .cte("removed")
+    )
+    row = (await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == removed.c.product_id)
+        .values(
+            rating_sum=ProductModel.rating_sum - removed.c.grade,
+            rating_count=ProductModel.rating_count - 1,
+        )
+        .returning(ProductModel.id, removed.c.grade)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is None:
+        return None
+
+    await db.execute(
+        update(ProductRatingHistogram)
+        .where(ProductRatingHistogram.product_id == row.id)
+        .values({_grade_column(row.grade): _grade_column(row.grade) - 1})
+    )
+    return row.id
+
+def _rating_key(product_id: int) -> str:
+    return f"product_rating:{product_id}"
+
+async def get_product_rating(db: AsyncSession, product_id: int) -> dict | None:
+    """
+    Распределение оценок активного товара из кэша в Redis (PRODUCT_RATING_CACHE_TTL),
+    на промахе — одной строкой гистограммы, без чтения отзывов.
+    Возвращает None, если товар не найден или неактивен.
+    """
+    redis = get_redis()
+    key = _rating_key(product_id)
+    cached = await redis.get(key)
+    if cached is not None:
+        rating = json.loads(cached)
+        rating["grades"] = {int(grade): count for grade, count in rating["grades"].items()}
+        return rating
+
+    generation = await cache_generation(redis, key)
+
+    row = (await db.execute(
+        select(*(func.coalesce(_grade_column(grade), 0).label(f"grade_{grade}") for grade in GRADES))
+        .select_from(ProductModel)
+        .outerjoin(ProductRatingHistogram, ProductRatingHistogram.product_id == ProductModel.id)
+        .where(ProductModel.id == product_id, ProductModel.is_active == True)
+    )).first()
+    if row is None:
+        return None
+
+    grades = {grade: getattr(row, f"grade_{grade}") for grade in GRADES}
+    count = sum(grades.values())
+    rating = {
+        "product_id": product_id,
+        "rating": round(sum(grade * number for grade, number in grades.items()) / count, 2) if count else 0.0,
+        "rating_count": count,
+        "grades": grades,
+    }
+    await set_cached(redis, key, json.dumps(rating), PRODUCT_RATING_CACHE_TTL, generation)
+    return rating
+
+async def invalidate_product_ratings(product_ids: Iterable[int], redis=None) -> None:
+    """
+    Сбрасывает кэш распределения оценок; вызывается после изменения отзывов или товаров.
+    """
+    await invalidate_cached(redis or get_redis(), *(_rating_key(product_id) for product_id in product_ids))
+
+def _actual_ratings():
+    return (
+        select(
+            ReviewModel.product_id,
+            func.sum(ReviewModel.grade).label("rating_sum"),
+            func.count().label("rating_count"),
+            *(func.count().filter(ReviewModel.grade == grade).label(f"grade_{grade}") for grade in GRADES),
+        )
+        .where(ReviewModel.is_active == True)
+        .group_by(ReviewModel.product_id)
+        .subquery("actual")
+    )
+
+async def check_product_ratings(db: AsyncSession, fix: bool = False) -> list[dict]:
+    """
+    Сравнивает счётчики и гистограммы товаров с оценками их активных отзывов
+    и возвращает расхождения. При fix=True счётчики и гистограммы товаров
+    с расхождениями пересчитываются и изменения фиксируются.
+    """
+    actual = _actual_ratings()
+    stored = {
+        "rating_sum": ProductModel.rating_sum,
+        "rating_count": ProductModel.rating_count,
+        **{f"grade_{grade}": func.coalesce(_grade_column(grade), 0) for grade in GRADES},
+    }
+    expected = {name: func.coalesce(actual.c[name], 0) for name in stored}
+    result = await db.execute(
+        select(
+            ProductModel.id,
+            *(column.label(name) for name, column in stored.items()),
+            *(column.label(f"expected_{name}") for name, column in expected.items()),
+        )
+        .outerjoin(actual, actual.c.product_id == ProductModel.id)
+        .outerjoin(ProductRatingHistogram, ProductRatingHistogram.product_id == ProductModel.id)
+        .where(tuple_(*stored.values()) != tuple_(*expected.values()))
+        .order_by(ProductModel.id)
+    )
+    mismatches = [dict(row._mapping) for row in result]
+
+    if fix and mismatches:
+        # Пересчёт под блокировкой строк товаров, чтобы не разойтись с параллельными отзывами:
+        # создание и удаление отзыва меняют строку товара и ждут этой блокировки
+        product_ids = [mismatch["id"] for mismatch in mismatches]
+        await db.execute(
+            select(ProductModel.id).where(ProductModel.id.in_(product_ids)).order_by(ProductModel.id).with_for_update()
+        )
+        active = (ReviewModel.product_id == ProductModel.id, ReviewModel.is_active == True)
+        await db.execute(
+            update(ProductModel)
+            .where(ProductModel.id.in_(product_ids))
+            .values(
+                rating_sum=select(func.coalesce(func.sum(ReviewModel.grade), 0)).where(*active).scalar_subquery(),
+                rating_count=select(func.count()).where(*active).scalar_subquery(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        counts = (
+            select(
+                ProductModel.id,
+                *(func.count(ReviewModel.id).filter(ReviewModel.grade == grade) for grade in GRADES),
+            )
+            .outerjoin(ReviewModel, (ReviewModel.product_id == ProductModel.id) & (ReviewModel.is_active == True))
+            .where(ProductModel.id.in_(product_ids))
+            .group_by(ProductModel.id)
+        )
+        stmt = pg_insert(ProductRatingHistogram).from_select(
+            ["product_id", *(f"grade_{grade}" for grade in GRADES)], counts
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[ProductRatingHistogram.product_id],
+            set_={f"grade_{grade}": stmt.excluded[f"grade_{grade}"] for grade in GRADES},
+        ))
+        await db.commit()
+        await invalidate_product_ratings(product_ids)
+    return mismatches
+
+if __name__ == "__main__":
+    from app.celery_app import run_async
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="Пересчитать счётчики товаров с расхождениями")
+    args = parser.parse_args()
+
+    mismatches = run_async(check_product_ratings, args.fix)
+    for mismatch in mismatches:
+        differences = ", ".join(
+            f"{name} {value} (expected {mismatch['expected_' + name]})"
+            for name, value in mismatch.items()
+            if name != "id" and not name.startswith("expected_") and value != mismatch["expected_" + name]
+        )
+        print(f"product {mismatch['id']}: {differences}")
+    print(f"{len(mismatches)} mismatched products" + (", fixed" if args.fix and mismatches else ""))
+    raise SystemExit(1 if mismatches and not args.fix else 0)
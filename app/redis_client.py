@@ -0,0 +1,251 @@
+import fnmatch
+import time
+from redis import asyncio as aioredis
+from app.config import REDIS_URL
+
+# Адрес вида memory:// включает хранилище в памяти процесса вместо Redis (тесты, локальный запуск)
+MEMORY_URL_SCHEME = "memory://"
+
+_client = None
+
+def make_redis(url: str = REDIS_URL):
+    """
+    Создаёт новый клиент Redis (строки декодируются в str) или MemoryRedis для memory://.
+    Клиент redis.asyncio привязан к event loop, поэтому фоновые задачи создают свой.
+    """
+    if url.startswith(MEMORY_URL_SCHEME):
+        return MemoryRedis()
+    return aioredis.from_url(url, decode_responses=True)
+
+def get_redis():
+    """
+    Возвращает общий клиент Redis процесса приложения.
+    """
+    global _client
+    if _client is None:
+        _client = make_redis()
+    return _client
+
+class RedisScript:
+    """
+    Lua-скрипт, который Redis выполняет атомарно (EVALSHA с повтором через EVAL).
+    Для MemoryRedis вместо него вызывается эквивалентная корутина fallback(redis, keys, args):
+    команды хранилища в памяти не уступают event loop, поэтому она тоже выполняется целиком.
+    """
+
+    def __init__(self, lua: str, fallback):
+        self.lua = lua
+        self.fallback = fallback
+        self._script = None
+
+    async def __call__(self, redis, keys: list[str], args: list = ()):
+        if isinstance(redis, MemoryRedis):
+            return await self.fallback(redis, keys, list(args))
+        if self._script is None:
+            self._script = redis.register_script(self.lua)
+        return await self._script(keys=keys, args=list(args), client=redis)
+
+# Поколение ключа кэша живёт заведомо дольше любого запроса, чтобы счётчик
+# не начался заново, пока запрос читает данные для кэша
+CACHE_GENERATION_TTL = 86400
+
+def _generation_key(name: str) -> str:
+    return f"{name}:generation"
+
+async def cache_generation(redis, name: str) -> str:
+    """
+    Текущее поколение ключа кэша name. Читается до запроса к БД, результат которого
+    потом кладётся в кэш через set_cached.
+    """
+    return await redis.get(_generation_key(name)) or "0"
+
+async def _set_if_generation_in_memory(redis, keys: list[str], args: list) -> int:
+    if (await redis.get(keys[1]) or "0") != args[0]:
+        return 0
+    await redis.set(keys[0], args[1], ex=int(args[2]))
+    return 1
+
+# SET с TTL (ARGV: поколение, значение, TTL), только если поколение ключа не изменилось
+_SET_IF_GENERATION = RedisScript(
+    """
+    if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+    """,
+    _set_if_generation_in_memory,
+)
+
+async def set_cached(redis, name: str, value: str, ttl: int, generation: str) -> bool:
+    """
+    Кладёт value в кэш, если с момента чтения generation ключ не сбрасывали:
+    значение, прочитанное из БД до чужого commit, не вернётся в кэш после его сброса.
+    """
+    return bool(await _SET_IF_GENERATION(redis, [name, _generation_key(name)], [generation, value, ttl]))
+
+async def _invalidate_cached_in_memory(redis, keys: list[str], args: list) -> None:
+    for name in keys:
+        await redis.incrby(_generation_key(name))
+        await redis.expire(_generation_key(name), int(args[0]))
+    await redis.delete(*keys)
+
+# Увеличивает поколение каждого ключа (ARGV: TTL поколения) и удаляет сами значения
+_INVALIDATE_CACHED = RedisScript(
+    """
+    for _, name in ipairs(KEYS) do
+        redis.call('INCR', name .. ':generation')
+        redis.call('EXPIRE', name .. ':generation', ARGV[1])
+    end
+    redis.call('DEL', unpack(KEYS))
+    """,
+    _invalidate_cached_in_memory,
+)
+
+async def invalidate_cached(redis, *names: str) -> None:
+    """
+    Сбрасывает ключи кэша после commit изменивших их данных; запросы, начавшие чтение
+    до сброса, уже не смогут записать свои значения (set_cached).
+    """
+    if names:
+        await _INVALIDATE_CACHED(redis, list(names), [CACHE_GENERATION_TTL])
+
+class MemoryRedis:
+    """
+    Минимальная асинхронная замена Redis в памяти процесса с тем же интерфейсом
+    для используемых приложением команд (строки, хэши, множества, TTL).
+    Значения хранятся строками, как у клиента с decode_responses=True.
+    """
+
+    def __init__(self):
+        self._data: dict = {}
+        self._expires: dict[str, float] = {}
+
+    def _alive(self, name: str) -> bool:
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return name in self._data
+
+    def _container(self, name: str, factory):
+        if not self._alive(name):
+            self._data[name] = factory()
+        return self._data[name]
+
+    def _drop_if_empty(self, name: str) -> None:
+        if not self._data.get(name):
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+    # --- ключи ---
+
+    async def delete(self, *names: str) -> int:
+        removed = 0
+        for name in names:
+            if self._alive(name):
+                removed += 1
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+        return removed
+
+    async def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._alive(name))
+
+    async def expire(self, name: str, seconds: float) -> bool:
+        if not self._alive(name):
+            return False
+        self._expires[name] = time.monotonic() + seconds
+        return True
+
+    async def keys(self, pattern: str = "*") -> list[str]:
+        return [name for name in list(self._data) if self._alive(name) and fnmatch.fnmatchcase(name, pattern)]
+
+    # --- строки ---
+
+    async def get(self, name: str) -> str | None:
+        return self._data.get(name) if self._alive(name) else None
+
+    async def mget(self, names) -> list[str | None]:
+        return [await self.get(name) for name in names]
+
+    async def set(self, name: str, value, ex: float | None = None, nx: bool = False) -> bool | None:
+        if nx and self._alive(name):
+            return None
+        self._data[name] = str(value)
+        self._expires.pop(name, None)
+        if ex is not None:
+            self._expires[name] = time.monotonic() + ex
+        return True
+
+    async def incrby(self, name: str, amount: int = 1) -> int:
+        value = int(await self.get(name) or 0) + amount
+        self._data[name] = str(value)
+        return value
+
+    # --- хэши ---
+
+    async def hget(self, name: str, key: str) -> str | None:
+        return self._data[name].get(str(key)) if self._alive(name) else None
+
+    async def hgetall(self, name: str) -> dict[str, str]:
+        return dict(self._data[name]) if self._alive(name) else {}
+
+    async def hexists(self, name: str, key: str) -> bool:
+        return self._alive(name) and str(key) in self._data[name]
+
+    async def hset(self, name: str, key: str | None = None, value=None, mapping: dict | None = None) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        container = self._container(name, dict)
+        added = sum(1 for field in items if str(field) not in container)
+        container.update({str(field): str(field_value) for field, field_value in items.items()})
+        return added
+
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        container = self._container(name, dict)
+        value = int(container.get(str(key), 0)) + amount
+        container[str(key)] = str(value)
+        return value
+
+    async def hdel(self, name: str, *keys: str) -> int:
+        if not self._alive(name):
+            return 0
+        container = self._data[name]
+        removed = sum(1 for key in keys if container.pop(str(key), None) is not None)
+        self._drop_if_empty(name)
+        return removed
+
+    # --- множества ---
+
+    async def sadd(self, name: str, *values) -> int:
+        container = self._container(name, set)
+        added = sum(1 for value in values if str(value) not in container)
+        container.update(str(value) for value in values)
+        return added
+
+    async def srem(self, name: str, *values) -> int:
+        if not self._alive(name):
+            return 0
+        container = self._data[name]
+        removed = sum(1 for value in values if str(value) in container)
+        container.difference_update(str(value) for value in values)
+        self._drop_if_empty(name)
+        return removed
+
+    async def smembers(self, name: str) -> "set[str]":
+        return set(self._data[name]) if self._alive(name) else set()
+
+    async def spop(self, name: str, count: int | None = None):
+        if not self._alive(name):
+            return [] if count is not None else None
+        container = self._data[name]
+        popped = [container.pop() for _ in range(min(count if count is not None else 1, len(container)))]
+        self._drop_if_empty(name)
+        if count is None:
+            return popped[0] if popped else None
+        return popped
+
+    async def aclose(self) -> None:
+        pass
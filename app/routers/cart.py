@@ -1,34 +1,29 @@
 from decimal import Decimal
-from fastapi import APIRouter, Depends, HTTPException, Response, status
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from app.utils import _get_cart_item, _ensure_product_available
 from app.auth import get_current_user
+from app.cart_backend import get_cart_backend, get_cart_summary, invalidate_cart_summary, SqlCartBackend, RedisCartBackend
 from app.db_depends import get_async_db
-from app.models.cart_items import CartItem as CartItemModel
+from app.idempotency import IdempotentRoute
 from app.models.users import User as UserModel
 from app.schemas import (
     Cart as CartSchema,
+    CartSummary,
     CartItem as CartItemSchema,
     CartItemCreate,
     CartItemUpdate,
 )
 
-router = APIRouter(prefix="/cart", tags=["cart"])
+router = APIRouter(prefix="/cart", tags=["cart"], route_class=IdempotentRoute)
 
 @router.get("/", response_model=CartSchema)
 async def get_cart(
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
-    result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    items = result.all()
+    # ORM-объекты (sql) и словари (redis) приводятся к одной схеме
+    items = [CartItemSchema.model_validate(item) for item in await backend.get_items(db, current_user.id)]
 
     total_quantity = sum(item.quantity for item in items)
     price_items = (
@@ -45,66 +40,58 @@ async def get_cart(
         total_price=total_price_decimal
     )
 
+@router.get("/summary", response_model=CartSummary)
+async def get_cart_summary_endpoint(
+    db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Возвращает количество позиций, общее количество и стоимость товаров в корзине
+    без загрузки самих позиций. Результат кэшируется и сбрасывается при изменении корзины.
+    """
+    return await get_cart_summary(db, backend, current_user.id)
+
 @router.post("/items", response_model=CartItemSchema, status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
     payload: CartItemCreate,
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
-    await _ensure_product_available(db, payload.product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    if cart_item:
-        cart_item.quantity += payload.quantity
-    else:
-        cart_item = CartItemModel(
-            user_id=current_user.id,
-            product_id=payload.product_id,
-            quantity=payload.quantity,
-        )
-        db.add(cart_item)
-
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, payload.product_id)
-    return updated_item
+    item = await backend.add_item(db, current_user.id, payload.product_id, payload.quantity)
+    await invalidate_cart_summary(current_user.id)
+    return item
 
 @router.put("/items/{product_id}", response_model=CartItemSchema)
 async def update_cart_item(
     product_id: int,
     payload: CartItemUpdate,
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
-    await _ensure_product_available(db, product_id)
-
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    cart_item.quantity = payload.quantity
-    await db.commit()
-    updated_item = await _get_cart_item(db, current_user.id, product_id)
-    return updated_item
+    item = await backend.set_quantity(db, current_user.id, product_id, payload.quantity)
+    await invalidate_cart_summary(current_user.id)
+    return item
 
 @router.delete("/items/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_item_from_cart(
     product_id: int,
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
-    cart_item = await _get_cart_item(db, current_user.id, product_id)
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Cart item not found")
-
-    await db.delete(cart_item)
-    await db.commit()
+    await backend.remove_item(db, current_user.id, product_id)
+    await invalidate_cart_summary(current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
+    await backend.clear(db, current_user.id)
+    await invalidate_cart_summary(current_user.id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy import select, update
 from app.models.categories import Category as CategoryModel
-from app.schemas import Category as CategorySchema, CategoryCreate
+from app.schemas import Category as CategorySchema, CategoryCreate, CategoryTreeNode
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_depends import get_async_db
+from app.conditional import make_etag, cache_headers, is_not_modified, not_modified
+from app.versions import get_versions
+from app.category_tree import category_tree_cache
+from app.utils import _invalidate_categories, _closure_add, _closure_move, _closure_detach, _is_in_subtree, _lock_category_tree
 
 # from app.db_depends import get_db
 # from sqlalchemy.orm import Session
@@ -15,15 +19,33 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=list[CategorySchema])
-async def get_all_categories(db: AsyncSession = Depends(get_async_db)):
+async def get_all_categories(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """
     Возвращает список всех активных категорий.
     """
+    (categories_version,) = await get_versions(db, "categories")
+    headers = cache_headers(make_etag("categories", categories_version))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+    response.headers.update(headers)
+
     stmt = select(CategoryModel).where(CategoryModel.is_active == True)
     result = await db.scalars(stmt)
     categories = result.all()
     return categories
 
+@router.get("/tree", response_model=list[CategoryTreeNode])
+async def get_category_tree(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает иерархию активных категорий в виде дерева.
+    Отдаётся готовый снимок из памяти процесса; он перестраивается только после изменения категорий.
+    """
+    snapshot = await category_tree_cache.get(db)
+    headers = cache_headers(make_etag("categories-tree", snapshot.version))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
 @router.post("/", response_model=CategorySchema, status_code=status.HTTP_201_CREATED)
 async def create_category(category: CategoryCreate, db: AsyncSession = Depends(get_async_db)):
     """
@@ -38,10 +60,13 @@ async def create_category(category: CategoryCreate, db: AsyncSession = Depends(g
         if parent is None:
             raise HTTPException(status_code=400, detail="Parent category not found")
 
-    # Создание новой категории
+    # Создание новой категории вместе со строками таблицы замыкания
     db_category = CategoryModel(**category.model_dump())
     db.add(db_category)
+    await db.flush()
+    await _closure_add(db, db_category.id, db_category.parent_id)
     await db.commit()
+    await _invalidate_categories(db)
     return db_category
 
 @router.put("/{category_id}", response_model=CategorySchema)
@@ -49,6 +74,11 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
     """
     Обновляет категорию по её ID.
     """
+    if "parent_id" in category.model_fields_set:
+        # Перенос проверяется и выполняется под блокировкой дерева: иначе два встречных переноса
+        # (A под B и B под A) оба пройдут проверку на цикл. Категория читается уже после блокировки
+        await _lock_category_tree(db)
+
     # Проверка существования категории
     stmt = select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
     result = await db.scalars(stmt)
@@ -66,15 +96,21 @@ async def update_category(category_id: int, category: CategoryCreate, db: AsyncS
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parent category not found")
         if parent.id == category_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category cannot be its own")
+        if await _is_in_subtree(db, parent.id, category_id):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category cannot be moved into its own subtree")
 
     # Обновление категории
     update_data = category.model_dump(exclude_unset=True)
+    parent_changed = "parent_id" in update_data and update_data["parent_id"] != db_category.parent_id
     await db.execute(
         update(CategoryModel)
         .where(CategoryModel.id == category_id)
         .values(**update_data)
     )
+    if parent_changed:
+        await _closure_move(db, category_id, update_data["parent_id"])
     await db.commit()
+    await _invalidate_categories(db)
     return db_category
 
 
@@ -90,8 +126,11 @@ async def delete_category(category_id: int, db: AsyncSession = Depends(get_async
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    # Логическое удаление категории (установка is_active=False)
+    # Логическое удаление категории (установка is_active=False);
+    # её поддерево перестаёт входить в поддеревья предков
     await db.execute(update(CategoryModel).where(CategoryModel.id == category_id).values(is_active=False))
+    await _closure_detach(db, category_id)
     await db.commit()
+    await _invalidate_categories(db)
 
     return {"status": "success", "message": "Category marked as inactive"}
\ No newline at end of file
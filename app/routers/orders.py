@@ -1,85 +1,58 @@
-from decimal import Decimal
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import delete, func, select
+from datetime import datetime
+from sqlalchemy import func, select, true, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from app.auth import get_current_user
 from app.db_depends import get_async_db
-from app.models.cart_items import CartItem as CartItemModel
+from app.idempotency import IdempotentRoute
 from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
 from app.models.users import User as UserModel
-from app.schemas import Order as OrderSchema, OrderList
-from app.utils import _load_order_with_items
+from app.schemas import Order as OrderSchema, OrderList, OrderSummaryList
+from app.utils import _load_order_with_items, _reserve_stock, _create_order, _encode_cursor, _decode_cursor, _invalidate_products
+from app.order_tasks import enqueue_order_processing
+from app.cart_backend import get_cart_backend, invalidate_cart_summary, SqlCartBackend, RedisCartBackend
+from app.config import STOCK_HOLDS_ENABLED
+from app.stock_holds import release_holds
 
-router = APIRouter(prefix="/orders", tags=["orders"],)
+router = APIRouter(prefix="/orders", tags=["orders"], route_class=IdempotentRoute)
 
 @router.post("/checkout", response_model=OrderSchema, status_code=status.HTTP_201_CREATED)
 async def checkout_order(
     db: AsyncSession = Depends(get_async_db),
+    backend: SqlCartBackend | RedisCartBackend = Depends(get_cart_backend),
     current_user: UserModel = Depends(get_current_user),
 ):
     """
     Создаёт заказ на основе текущей корзины пользователя.
     Сохраняет позиции заказа, вычитает остатки и очищает корзину.
     """
-    cart_result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
-        .where(CartItemModel.user_id == current_user.id)
-        .order_by(CartItemModel.id)
-    )
-    cart_items = cart_result.all()
-    if not cart_items:
+    lines = await backend.take_lines(db, current_user.id)
+    if not lines:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty")
 
-    order = OrderModel(user_id=current_user.id)
-    total_amount = Decimal("0")
-
-    for cart_item in cart_items:
-        product = cart_item.product
-        if not product or not product.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Product {cart_item.product_id} is unavailable",
-            )
-        if product.stock < cart_item.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Not enough stock for product {product.name}",
-            )
-
-        unit_price = product.price
-        if unit_price is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Product {product.name} has no price set",
-            )
-        total_price = unit_price * cart_item.quantity
-        total_amount += total_price
-
-        order_item = OrderItemModel(
-            product_id=cart_item.product_id,
-            quantity=cart_item.quantity,
-            unit_price=unit_price,
-            total_price=total_price,
-        )
-        order.items.append(order_item)
-
-        product.stock -= cart_item.quantity
+    try:
+        if STOCK_HOLDS_ENABLED:
+            # Брони пользователя снимаются в транзакции заказа и сразу превращаются в списание ниже
+            await release_holds(db, current_user.id)
 
-    order.total_amount = total_amount
-    db.add(order)
+        # Остатки списываются одним условным UPDATE; при нехватке — 400 со списком позиций
+        reserved = await _reserve_stock(db, lines)
 
-    await db.execute(delete(CartItemModel).where(CartItemModel.user_id == current_user.id))
-    await db.commit()
-
-    created_order = await _load_order_with_items(db, order.id)
-    if not created_order:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to load created order",
-        )
-    return created_order
+        # Заказ и позиции создаются одним запросом, ответ собирается из RETURNING
+        order = await _create_order(db, current_user.id, lines, reserved)
+        await db.commit()
+    except Exception:
+        # Заказ не зафиксирован — забранные позиции возвращаются в корзину
+        await backend.return_lines(current_user.id, lines)
+        raise
+    await backend.after_checkout(current_user.id, lines)
+    await invalidate_cart_summary(current_user.id)
+    # Остатки изменились: новый ETag списков, сброс кэша total (фильтр in_stock) и кэша товаров корзины
+    await _invalidate_products(db, [product_id for product_id, _ in lines])
+    # Оплата и выполнение заказа идут в фоне, запрос только записывает заказ и ставит его в очередь
+    await enqueue_order_processing(order["id"])
+    return order
 
 @router.get("/", response_model=OrderList)
 async def list_orders(
@@ -106,6 +79,49 @@ async def list_orders(
 
     return OrderList(items=orders, total=total or 0, page=page, page_size=page_size)
 
+@router.get("/summary", response_model=OrderSummaryList)
+async def list_order_summaries(
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Возвращает историю заказов текущего пользователя: только заголовки и количество позиций.
+    Новые заказы сверху, курсорная пагинация по (created_at, id) без OFFSET и без подсчёта total.
+    """
+    # Агрегаты по позициям считаются только для заказов текущей страницы
+    items = (
+        select(
+            func.count().label("items_count"),
+            func.coalesce(func.sum(OrderItemModel.quantity), 0).label("total_quantity"),
+        )
+        .where(OrderItemModel.order_id == OrderModel.id)
+        .lateral("items")
+    )
+    stmt = (
+        select(
+            OrderModel.id, OrderModel.status, OrderModel.total_amount,
+            OrderModel.created_at, OrderModel.updated_at,
+            items.c.items_count, items.c.total_quantity,
+        )
+        .join(items, true())
+        .where(OrderModel.user_id == current_user.id)
+        .order_by(OrderModel.created_at.desc(), OrderModel.id.desc())
+    )
+    if cursor is not None:
+        last_created_at, last_id = _decode_cursor(cursor, datetime.fromisoformat, int)
+        stmt = stmt.where(tuple_(OrderModel.created_at, OrderModel.id) < tuple_(last_created_at, last_id))
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = (await db.execute(stmt.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return OrderSummaryList(items=rows, page_size=page_size, next_cursor=next_cursor)
+
 @router.get("/{order_id}", response_model=OrderSchema)
 async def get_order(
     order_id: int,
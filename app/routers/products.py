@@ -1,14 +1,26 @@
-from fastapi import APIRouter, status, HTTPException, Depends, Query
+from fastapi import APIRouter, status, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from app.models import Category as CategoryModel
-from app.schemas import ProductCreate, Product as ProductSchema, Review as ReviewSchema, ProductList
+from app.schemas import ProductCreate, Product as ProductSchema, ReviewList, ProductList, ProductRating
+from app.schemas import ProductBulkItem, ProductBulkResponse, StockSlots, StockSlotsUpdate
 from app.models import Product as ProductModel
 from app.models import Review as ReviewModel
-from sqlalchemy import select, update, func, desc
+from app.models import ProductStockSlot
+from sqlalchemy import select, update, func, desc, or_, and_, true
+from sqlalchemy.orm import aliased
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db_depends import get_async_db
 from app.models.users import User as UserModel
 from app.auth import get_current_seller
+from app.utils import _encode_cursor, _decode_cursor, _product_search, _count_products, _invalidate_products, _category_filter, _product_filters
+from app.utils import _bulk_upsert_products, _set_stock_slots, _redistribute_stock_slots, _review_page, _review_cursor
+from app.config import PRODUCT_BULK_MAX_ITEMS, STOCK_SLOTS_ENABLED
+from app.conditional import make_etag, cache_headers, is_not_modified, not_modified
+from app.versions import get_versions
+from app.loaders import CatalogLoader, get_catalog_loader
+from app.export import stream_products, stream_reviews, EXPORT_MEDIA_TYPES
+from app.ratings import get_product_rating
 
 # from sqlalchemy.orm import Session
 # from app.db_depends import get_db
@@ -21,176 +33,305 @@ router = APIRouter(
 
 @router.get("/", response_model=ProductList)
 async def get_all_products(
+        request: Request,
+        response: Response,
         page: int = Query(1, ge=1),
         page_size: int = Query(20, ge=1, le=100),
         category_id: int | None = Query(None, description="ID категории для фильтрации"),
+        include_subcategories: bool = Query(True, description="Учитывать товары всех подкатегорий category_id"),
         min_price: float | None = Query(None, ge=0, description="Минимальная цена товара"),
         max_price: float | None = Query(None, ge=0, description="Максимальная цена товара"),
-        search: str | None = Query(None, min_length=1, description="Поиск по названию товара"),
+        search: str | None = Query(None, min_length=1, description="Поиск по названию и описанию товара"),
         in_stock: bool | None = Query(None, description="true — только товары в наличии, false — только без остатка"),
         seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
         created_at: datetime |None = Query(None, description="Время создания товара"),
+        cursor: str | None = Query(None, description="Курсор из next_cursor предыдущего ответа; если указан, page игнорируется"),
         db: AsyncSession = Depends(get_async_db),
 ):
     """
     Возвращает список всех активных товаров с поддержкой фильтров.
+    Поддерживает OFFSET-пагинацию (page/page_size) и курсорную (cursor/page_size).
     """
-    # Проверка логики min_price <= max_price
-    if min_price is not None and max_price is not None and min_price > max_price:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="min_price не может быть больше max_price",
-        )
-
-    # Формируем список фильтров
-    filters = [ProductModel.is_active == True]
-
-    if category_id is not None:
-        filters.append(ProductModel.category_id == category_id)
+    # Формируем список фильтров (заодно проверяется min_price <= max_price)
+    filters = _product_filters(category_id, include_subcategories, min_price, max_price, in_stock, seller_id, created_at)
 
-    if min_price is not None:
-        filters.append(ProductModel.price >= min_price)
+    # Условный GET: ответ целиком определяется версиями каталога (товары и иерархия категорий)
+    # и параметрами запроса
+    products_version, categories_version = await get_versions(db, "products", "categories")
+    etag = make_etag("products", products_version, categories_version, sorted(request.query_params.multi_items()))
+    headers = cache_headers(etag)
+    if is_not_modified(request, etag):
+        return not_modified(headers)
+    response.headers.update(headers)
 
-    if max_price is not None:
-        filters.append(ProductModel.price <= max_price)
+    rank = None
+    search_value = search.strip() if search is not None else ""
+    if search_value:
+        search_filter, rank = _product_search(search_value)
+        filters.append(search_filter)
 
-    if in_stock is not None:
-        filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
-
-    if seller_id is not None:
-        filters.append(ProductModel.seller_id == seller_id)
-
-    if created_at is not None:
-        filters.append(ProductModel.created_at >= created_at)
+    # Подсчёт общего количества с учётом фильтров (кэш по нормализованному набору фильтров)
+    signature = (
+        products_version, categories_version,
+        category_id, include_subcategories, min_price, max_price, in_stock, seller_id, created_at, search_value.lower(),
+    )
+    total, total_estimated = await _count_products(db, filters, signature)
 
-    if search is not None:
-        search_value = search.strip()
-        if search_value:
-            filters.append(func.lower(ProductModel.name).like(f"%{search_value.lower()}%"))
+    # Выборка товаров с фильтрами и пагинацией
+    products_stmt = select(ProductModel).where(*filters)
+    if rank is not None:
+        # Сначала самые релевантные, id — для стабильного порядка при равном ранге
+        products_stmt = products_stmt.add_columns(rank).order_by(rank.desc(), ProductModel.id)
+    else:
+        products_stmt = products_stmt.order_by(ProductModel.id)
 
-    # Подсчёт общего количества с учётом фильтров
-    total_stmt = select(func.count()).select_from(ProductModel).where(*filters)
-    total = await db.scalar(total_stmt) or 0
+    if cursor is not None:
+        # Keyset: продолжаем сразу после последней выданной записи, без OFFSET
+        if rank is not None:
+            last_rank, last_id = _decode_cursor(cursor, float, int)
+            products_stmt = products_stmt.where(
+                or_(rank < last_rank, and_(rank == last_rank, ProductModel.id > last_id))
+            )
+        else:
+            (last_id,) = _decode_cursor(cursor, int)
+            products_stmt = products_stmt.where(ProductModel.id > last_id)
+    else:
+        products_stmt = products_stmt.offset((page - 1) * page_size)
 
-    # Выборка товаров с фильтрами и пагинацией
-    products_stmt = (
-        select(ProductModel)
-        .where(*filters)
-        .order_by(ProductModel.id)
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-    )
-    items = (await db.scalars(products_stmt)).all()
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = (await db.execute(products_stmt.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_row = rows[-1]
+        if rank is not None:
+            next_cursor = _encode_cursor(last_row[1], last_row[0].id)
+        else:
+            next_cursor = _encode_cursor(last_row[0].id)
+    items = [row[0] for row in rows]
 
     return {
         "items": items,
         "total": total,
+        "total_estimated": total_estimated,
         "page": page,
         "page_size": page_size,
+        "next_cursor": next_cursor,
     }
 
+@router.get("/export")
+async def export_products(
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат выгрузки: ndjson или csv"),
+        category_id: int | None = Query(None, description="ID категории для фильтрации"),
+        include_subcategories: bool = Query(True, description="Учитывать товары всех подкатегорий category_id"),
+        min_price: float | None = Query(None, ge=0, description="Минимальная цена товара"),
+        max_price: float | None = Query(None, ge=0, description="Максимальная цена товара"),
+        search: str | None = Query(None, min_length=1, description="Поиск по названию и описанию товара"),
+        in_stock: bool | None = Query(None, description="true — только товары в наличии, false — только без остатка"),
+        seller_id: int | None = Query(None, description="ID продавца для фильтрации"),
+        created_at: datetime | None = Query(None, description="Время создания товара"),
+):
+    """
+    Потоково выгружает все активные товары, подходящие под фильтры, в NDJSON или CSV.
+    Товары идут по возрастанию id, без пагинации и подсчёта total.
+    """
+    filters = _product_filters(category_id, include_subcategories, min_price, max_price, in_stock, seller_id, created_at)
+    search_value = search.strip() if search is not None else ""
+    if search_value:
+        search_filter, _ = _product_search(search_value)
+        filters.append(search_filter)
+
+    return StreamingResponse(
+        stream_products(filters, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
 @router.get("/category/{category_id}", response_model=list[ProductSchema])
-async def get_products_by_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_products_by_category(
+    category_id: int,
+    include_subcategories: bool = Query(True, description="Учитывать товары всех подкатегорий"),
+    db: AsyncSession = Depends(get_async_db),
+    loader: CatalogLoader = Depends(get_catalog_loader),
+):
     """
-    Возвращает список товаров в указанной категории по её ID.
+    Возвращает список товаров в указанной категории по её ID
+    (по умолчанию вместе с товарами подкатегорий).
     """
-    stmt = select(CategoryModel).where(CategoryModel.id == category_id, CategoryModel.is_active == True)
-    temp = await db.scalars(stmt)
-    db_category = temp.first()
+    db_category = await loader.get_category(category_id)
 
-    if not db_category:
+    if not db_category or not db_category.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found or inactive")
 
-    stmt = select(ProductModel).where(ProductModel.category_id == category_id, ProductModel.is_active == True)
+    stmt = select(ProductModel).where(_category_filter(category_id, include_subcategories), ProductModel.is_active == True)
     temp = await db.scalars(stmt)
     products = temp.all()
 
     return products
 
 @router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    loader: CatalogLoader = Depends(get_catalog_loader),
+):
     """
     Возвращает детальную информацию о товаре по его ID.
     """
-    stmt = select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    temp = await db.scalars(stmt)
-    product = temp.first()
+    # Товар и его категория одним запросом
+    product, category = await loader.get_product_and_category(product_id)
 
-    if not product:
+    if not product or not product.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
 
-    stmt = select(CategoryModel).where(CategoryModel.id == product.category_id, CategoryModel.is_active == True)
-    temp = await db.scalars(stmt)
-    category = temp.first()
-
-    if not category:
+    if not category or not category.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
+    # updated_at меняется при любом изменении товара, включая остаток
+    headers = cache_headers(make_etag("product", product.id, product.updated_at.isoformat()), product.updated_at)
+    if is_not_modified(request, headers["ETag"], product.updated_at):
+        return not_modified(headers)
+    response.headers.update(headers)
     return product
 
+@router.get("/{product_id}/rating", response_model=ProductRating)
+async def get_product_rating_histogram(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Возвращает среднюю оценку и распределение оценок 1–5 по активным отзывам товара.
+    Берётся из кэша или из строки гистограммы, поэтому не зависит от числа отзывов.
+    """
+    rating = await get_product_rating(db, product_id)
+    if rating is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    return rating
+
 @router.post("/", response_model=ProductSchema, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product: ProductCreate,
     db: AsyncSession = Depends(get_async_db),
+    loader: CatalogLoader = Depends(get_catalog_loader),
     current_user: UserModel = Depends(get_current_seller)
 ):
     """
     Создаёт новый товар, привязанный к текущему продавцу (только для 'seller').
     """
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id, CategoryModel.is_active == True)
-    )
-    if not category_result.first():
+    category = await loader.get_category(product.category_id)
+    if not category or not category.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
 
     db_product = ProductModel(**product.model_dump(), seller_id=current_user.id)
     db.add(db_product)
     await db.commit()
+    await _invalidate_products(db)
     await db.refresh(db_product)  # Для получения id и is_active из базы
     return db_product
 
+@router.post("/bulk", response_model=ProductBulkResponse)
+async def bulk_upsert_products(
+    items: list[ProductBulkItem],
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(get_current_seller)
+):
+    """
+    Массово создаёт и обновляет товары текущего продавца (только для 'seller').
+    Позиция с client_key обновляет товар продавца с тем же ключом или создаёт его.
+    Ошибка в одной позиции не отменяет остальные: результат возвращается для каждой.
+    """
+    if len(items) > PRODUCT_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many items, maximum is {PRODUCT_BULK_MAX_ITEMS}",
+        )
+
+    results = await _bulk_upsert_products(db, current_user.id, items)
+    # Новый остаток товаров со слотами раскладывается по слотам в той же транзакции
+    await _redistribute_stock_slots(db, [result["product_id"] for result in results if result["status"] == "updated"])
+    await db.commit()
+
+    counts = {"created": 0, "updated": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    if counts["created"] or counts["updated"]:
+        await _invalidate_products(db, (result["product_id"] for result in results if result["status"] == "updated"))
+    return {"items": results, **counts}
+
 @router.put("/{product_id}", response_model=ProductSchema)
 async def update_product(
     product_id: int,
     product: ProductCreate,
     db: AsyncSession = Depends(get_async_db),
+    loader: CatalogLoader = Depends(get_catalog_loader),
     current_user: UserModel = Depends(get_current_seller)
 ):
     """
     Обновляет товар, если он принадлежит текущему продавцу (только для 'seller').
     """
-    result = await db.scalars(select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True))
-    db_product = result.first()
-    if not db_product:
+    # Товар и новая категория проверяются одним запросом
+    db_product, category = await loader.get_product_and_category(product_id, product.category_id)
+    if not db_product or not db_product.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     if db_product.seller_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
-    category_result = await db.scalars(
-        select(CategoryModel).where(CategoryModel.id == product.category_id, CategoryModel.is_active == True)
-    )
-    if not category_result.first():
+    if not category or not category.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Category not found or inactive")
     await db.execute(
         update(ProductModel).where(ProductModel.id == product_id).values(**product.model_dump())
     )
+    if db_product.stock_slots:
+        await _redistribute_stock_slots(db, [product_id])
     await db.commit()
+    await _invalidate_products(db, [product_id])
     await db.refresh(db_product)  # Для консистентности данных
     return db_product
 
+@router.put("/{product_id}/stock-slots", response_model=StockSlots)
+async def update_stock_slots(
+    product_id: int,
+    payload: StockSlotsUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    loader: CatalogLoader = Depends(get_catalog_loader),
+    current_user: UserModel = Depends(get_current_seller)
+):
+    """
+    Включает, меняет или выключает слоты остатка товара текущего продавца (только для 'seller').
+    Со слотами параллельные заказы списывают остаток из разных строк и не ждут блокировки
+    одной строки товара; поле stock обновляется фоновой задачей с небольшой задержкой.
+    При включённых бронях остатков (STOCK_HOLDS_ENABLED) слоты можно только выключить.
+    """
+    if payload.slots and not STOCK_SLOTS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Stock slots are not available while stock holds are enabled",
+        )
+    product = await loader.get_product(product_id)
+    if not product or not product.is_active:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
+    if product.seller_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only update your own products")
+
+    await _set_stock_slots(db, product_id, payload.slots)
+    await db.commit()
+    await _invalidate_products(db, [product_id])
+
+    stock = await db.scalar(select(ProductModel.stock).where(ProductModel.id == product_id))
+    slots = await db.scalars(
+        select(ProductStockSlot.stock).where(ProductStockSlot.product_id == product_id).order_by(ProductStockSlot.slot)
+    )
+    return StockSlots(product_id=product_id, stock_slots=payload.slots, stock=stock, slots=slots.all())
+
 @router.delete("/{product_id}", response_model=ProductSchema)
 async def delete_product(
     product_id: int,
     db: AsyncSession = Depends(get_async_db),
+    loader: CatalogLoader = Depends(get_catalog_loader),
     current_user: UserModel = Depends(get_current_seller)
 ):
     """
     Выполняет мягкое удаление товара, если он принадлежит текущему продавцу (только для 'seller').
     """
-    result = await db.scalars(
-        select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    )
-    product = result.first()
-    if not product:
+    product = await loader.get_product(product_id)
+    if not product or not product.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or inactive")
     if product.seller_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You can only delete your own products")
@@ -198,20 +339,69 @@ async def delete_product(
         update(ProductModel).where(ProductModel.id == product_id).values(is_active=False)
     )
     await db.commit()
+    await _invalidate_products(db, [product_id])
     await db.refresh(product)  # Для возврата is_active = False
     return product
 
-@router.get("/{product_id}/reviews/", response_model=list[ReviewSchema])
-async def product_reviews(product_id: int, db: AsyncSession = Depends(get_async_db)):
-    stmt = select(ProductModel).where(ProductModel.id == product_id, ProductModel.is_active == True)
-    temp = await db.scalars(stmt)
-    db_product = temp.first()
+@router.get("/{product_id}/reviews/", response_model=ReviewList)
+async def product_reviews(
+    product_id: int,
+    request: Request,
+    response: Response,
+    page_size: int = Query(20, ge=1, le=100),
+    sort: str = Query("newest", pattern="^(newest|grade)$", description="newest — сначала новые, grade — сначала высокие оценки"),
+    cursor: str | None = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson — потоком все отзывы начиная с cursor, без страниц"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает активные отзывы активного товара с курсорной пагинацией по ключу сортировки.
+    """
+    if format == "ndjson":
+        # Начатый поток уже нельзя заменить на 404, поэтому товар проверяется до ответа
+        exists = await db.scalar(
+            select(ProductModel.id).where(ProductModel.id == product_id, ProductModel.is_active == True)
+        )
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        stmt = select(ReviewModel).where(ReviewModel.product_id == product_id, ReviewModel.is_active == True)
+        return StreamingResponse(stream_reviews(_review_page(stmt, sort, cursor)), media_type=EXPORT_MEDIA_TYPES["ndjson"])
 
-    if not db_product:
-        raise HTTPException(status_code=404, detail="Product not found")
+    # Ответ зависит от отзывов, от того, активен ли сам товар, и от параметров страницы
+    reviews_version, products_version = await get_versions(db, "reviews", "products")
+    headers = cache_headers(make_etag(
+        "product-reviews", product_id, reviews_version, products_version, sorted(request.query_params.multi_items())
+    ))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+    response.headers.update(headers)
 
-    stmt = select(ReviewModel).where(ReviewModel.product_id == db_product.id, ReviewModel.is_active == True)
-    temp = await db.scalars(stmt)
-    db_reviews = temp.all()
+    # Товар и страница отзывов одним запросом: LATERAL-подзапрос читает индекс отзывов товара
+    # не дальше page_size + 1 записей, а внешнее соединение оставляет строку товара без отзывов
+    page = (
+        _review_page(
+            select(ReviewModel).where(ReviewModel.product_id == ProductModel.id, ReviewModel.is_active == True),
+            sort,
+            cursor,
+        )
+        .limit(page_size + 1)
+        .subquery()
+        .lateral("page")
+    )
+    review = aliased(ReviewModel, page)
+    stmt = (
+        select(ProductModel.id, review)
+        .select_from(ProductModel)
+        .outerjoin(page, true())
+        .where(ProductModel.id == product_id, ProductModel.is_active == True)
+    )
+    rows = (await db.execute(_review_page(stmt, sort, None, entity=review))).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    return db_reviews
\ No newline at end of file
+    reviews = [row[1] for row in rows if row[1] is not None]
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        next_cursor = _review_cursor(reviews[-1], sort)
+    return {"items": reviews, "next_cursor": next_cursor}
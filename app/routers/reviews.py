@@ -1,41 +1,61 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.db_depends import get_async_db
-from app.schemas import Review, ReviewCreate
+from app.schemas import Review, ReviewCreate, ReviewList
 from app.models.reviews import Review as ReviewModel
-from app.models.products import Product as ProductModel
 from app.models.users import User as UserModel
 from app.auth import get_current_buyer
-from app.utils import update_product_rating
+from app.ratings import add_review_grade, deactivate_review
+from app.utils import _invalidate_reviews, _review_page, _review_cursor
+from app.export import stream_reviews, EXPORT_MEDIA_TYPES
+from app.loaders import CatalogLoader, get_catalog_loader
 
 router = APIRouter(prefix="/reviews",
                    tags=["reviews"])
 
-@router.get("/", response_model=list[Review])
-async def get_reviews(db: AsyncSession = Depends(get_async_db)):
-    stmt = select(ReviewModel).where(ReviewModel.is_active == True)
-    db_reviews = await db.scalars(stmt)
-
-    return db_reviews.all()
+@router.get("/", response_model=ReviewList)
+async def get_reviews(
+        page_size: int = Query(20, ge=1, le=100),
+        sort: str = Query("newest", pattern="^(newest|grade)$", description="newest — сначала новые, grade — сначала высокие оценки"),
+        cursor: str | None = Query(None, description="Курсор из next_cursor предыдущего ответа"),
+        format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson — потоком все отзывы начиная с cursor, без страниц"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Возвращает активные отзывы с курсорной пагинацией по ключу сортировки.
+    """
+    stmt = _review_page(select(ReviewModel).where(ReviewModel.is_active == True), sort, cursor)
+    if format == "ndjson":
+        return StreamingResponse(stream_reviews(stmt), media_type=EXPORT_MEDIA_TYPES["ndjson"])
+
+    # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+    reviews = (await db.scalars(stmt.limit(page_size + 1))).all()
+    next_cursor = None
+    if len(reviews) > page_size:
+        reviews = reviews[:page_size]
+        next_cursor = _review_cursor(reviews[-1], sort)
+    return {"items": reviews, "next_cursor": next_cursor}
 
 @router.post("/", response_model=Review)
 async def create_review(review: ReviewCreate,
                         db: AsyncSession = Depends(get_async_db),
+                        loader: CatalogLoader = Depends(get_catalog_loader),
                         current_user: UserModel = Depends(get_current_buyer)):
 
-    stmt = select(ProductModel).where(ProductModel.id == review.product_id, ProductModel.is_active == True)
-    temp = await db.scalars(stmt)
-    db_product = temp.first()
+    db_product = await loader.get_product(review.product_id)
 
-    if not db_product:
+    if not db_product or not db_product.is_active:
         raise HTTPException(status_code=404, detail="Product not found")
 
     new_review = ReviewModel(**review.model_dump(), user_id=current_user.id)
     db.add(new_review)
+    # Отзыв и счётчики оценок товара фиксируются одним commit
+    await add_review_grade(db, review.product_id, review.grade)
     await db.commit()
 
-    await update_product_rating(db, review.product_id)
+    await _invalidate_reviews(db, [review.product_id])
 
     return new_review
 
@@ -58,9 +78,11 @@ async def delete_review(review_id: int,
             detail="You can only delete your own reviews"
         )
 
-    db_review.is_active = False
+    # Отзыв мог быть удалён параллельным запросом после проверки выше
+    if await deactivate_review(db, review_id) is None:
+        raise HTTPException(status_code=404, detail="Review not found")
     await db.commit()
 
-    await update_product_rating(db, db_review.product_id)
+    await _invalidate_reviews(db, [db_review.product_id])
 
     return {"message": "Review deleted"}
\ No newline at end of file
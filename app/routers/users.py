@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from fastapi.security import OAuth2PasswordRequestForm
 from app.models.users import User as UserModel
 from app.db_depends import get_async_db
-from app.auth import hash_password, verify_password, create_access_token, create_refresh_token
+from app.auth import hash_password, verify_and_update_password, create_access_token, create_refresh_token
 import jwt
 from app.config import SECRET_KEY, ALGORITHM
 from app.schemas import UserCreate, User as UserSchema, RefreshTokenRequest
@@ -25,7 +25,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)
     # Создание объекта пользователя с хешированным паролем
     db_user = UserModel(
         email=user.email,
-        hashed_password=hash_password(user.password),
+        hashed_password=await hash_password(user.password),
         role=user.role
     )
 
@@ -42,12 +42,17 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSessi
     result = await db.scalars(
         select(UserModel).where(UserModel.email == form_data.username, UserModel.is_active == True))
     user = result.first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash is not None:
+        # Стоимость bcrypt изменилась — сохраняем хеш, пересчитанный с текущей
+        await db.execute(update(UserModel).where(UserModel.id == user.id).values(hashed_password=new_hash))
+        await db.commit()
     access_token = create_access_token(data={"sub": user.email, "role": user.role, "id": user.id})
     refresh_token = create_refresh_token(data={"sub": user.email, "role": user.role, "id": user.id})
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
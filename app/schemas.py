@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from decimal import Decimal
 from datetime import datetime
 from typing import Optional
+from app.config import STOCK_SLOTS_MAX
 
 class CategoryCreate(BaseModel):
     """
@@ -23,6 +24,14 @@ class Category(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class CategoryTreeNode(BaseModel):
+    """
+    Узел дерева категорий для GET /categories/tree.
+    """
+    id: int = Field(..., description="Уникальный идентификатор категории")
+    name: str = Field(..., description="Название категории")
+    children: list["CategoryTreeNode"] = Field(default_factory=list, description="Активные подкатегории")
+
 class ProductCreate(BaseModel):
     """
     Модель для создания и обновления товара.
@@ -47,22 +56,76 @@ class Product(BaseModel):
     price: Decimal = Field(..., description="Цена товара в рублях", gt=0, decimal_places=2)
     image_url: str | None = Field(None, description="URL изображения товара")
     stock: int = Field(..., description="Количество товара на складе")
+    rating: float = Field(0.0, description="Средняя оценка по активным отзывам")
     category_id: int = Field(..., description="ID категории")
     is_active: bool = Field(..., description="Активность товара")
 
     model_config = ConfigDict(from_attributes=True)
 
+class ProductRating(BaseModel):
+    """
+    Распределение оценок активных отзывов товара.
+    """
+    product_id: int = Field(..., description="ID товара")
+    rating: float = Field(..., ge=0, description="Средняя оценка")
+    rating_count: int = Field(..., ge=0, description="Количество оценок")
+    grades: dict[int, int] = Field(..., description="Количество оценок по звёздам: {1: ..., 5: ...}")
+
 class ProductList(BaseModel):
     """
     Список пагинации для товаров.
     """
     items: list[Product] = Field(description="Товары для текущей страницы")
     total: int = Field(ge=0, description="Общее количество товаров")
+    total_estimated: bool = Field(False, description="True, если total — оценка планировщика, а не точный подсчёт")
     page: int = Field(ge=1, description="Номер текущей страницы")
     page_size: int = Field(ge=1, description="Количество элементов на странице")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы (None, если страница последняя)")
 
     model_config = ConfigDict(from_attributes=True)  # Для чтения из ORM-объектов
 
+class ProductBulkItem(ProductCreate):
+    """
+    Товар для массовой загрузки. Позиция с client_key обновляет товар продавца
+    с тем же ключом (или создаёт его), без ключа — всегда создаёт новый товар.
+    """
+    client_key: str | None = Field(None, min_length=1, max_length=100,
+                                   description="Ключ товара в системе продавца (например, SKU)")
+
+class ProductBulkResult(BaseModel):
+    """
+    Результат обработки одной позиции массовой загрузки.
+    """
+    index: int = Field(..., ge=0, description="Порядковый номер позиции в запросе")
+    client_key: str | None = Field(None, description="Ключ товара из запроса")
+    status: str = Field(..., description="'created', 'updated' или 'failed'")
+    product_id: int | None = Field(None, description="ID созданного или обновлённого товара")
+    error: str | None = Field(None, description="Причина ошибки для 'failed'")
+
+class ProductBulkResponse(BaseModel):
+    """
+    Итог массовой загрузки товаров.
+    """
+    items: list[ProductBulkResult] = Field(description="Результаты в порядке позиций запроса")
+    created: int = Field(ge=0, description="Количество созданных товаров")
+    updated: int = Field(ge=0, description="Количество обновлённых товаров")
+    failed: int = Field(ge=0, description="Количество позиций с ошибкой")
+
+class StockSlotsUpdate(BaseModel):
+    """
+    Режим слотов остатка товара: 0 — обычный остаток, N — остаток разложен по N слотам.
+    """
+    slots: int = Field(..., ge=0, le=STOCK_SLOTS_MAX, description="Количество слотов остатка (0 — выключить)")
+
+class StockSlots(BaseModel):
+    """
+    Текущее распределение остатка товара по слотам.
+    """
+    product_id: int = Field(..., description="ID товара")
+    stock_slots: int = Field(..., ge=0, description="Количество слотов (0 — обычный режим)")
+    stock: int = Field(..., ge=0, description="Общий остаток")
+    slots: list[int] = Field(default_factory=list, description="Остаток в каждом слоте по порядку")
+
 class UserCreate(BaseModel):
     email: EmailStr = Field(description="Email пользователя")
     password: str = Field(min_length=8, description="Пароль (минимум 8 символов)")
@@ -96,6 +159,13 @@ class Review(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class ReviewList(BaseModel):
+    """
+    Страница отзывов с курсором продолжения.
+    """
+    items: list[Review] = Field(description="Отзывы текущей страницы")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы (None, если страница последняя)")
+
 class CartItemBase(BaseModel):
     product_id: int = Field(description="ID товара")
     quantity: int = Field(ge=1, description="Количество товара")
@@ -116,6 +186,13 @@ class CartItem(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class CartSummary(BaseModel):
+    """Итоги корзины без позиций (счётчик в шапке сайта)."""
+    user_id: int = Field(..., description="ID пользователя")
+    items_count: int = Field(..., ge=0, description="Количество позиций")
+    total_quantity: int = Field(..., ge=0, description="Общее количество товаров")
+    total_price: Decimal = Field(..., ge=0, description="Общая стоимость товаров")
+
 class Cart(BaseModel):
     """Полная информация о корзине пользователя."""
     user_id: int = Field(..., description="ID пользователя")
@@ -128,6 +205,7 @@ class Cart(BaseModel):
 class OrderItem(BaseModel):
     id: int = Field(..., description="ID позиции заказа")
     product_id: int = Field(..., description="ID товара")
+    product_name: str = Field(..., description="Название товара на момент покупки")
     quantity: int = Field(..., ge=1, description="Количество")
     unit_price: Decimal = Field(..., ge=0, description="Цена за единицу на момент покупки")
     total_price: Decimal = Field(..., ge=0, description="Сумма по позиции")
@@ -152,4 +230,23 @@ class OrderList(BaseModel):
     page: int = Field(ge=1, description="Текущая страница")
     page_size: int = Field(ge=1, description="Размер страницы")
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderSummary(BaseModel):
+    """
+    Заголовок заказа для истории заказов: без позиций, только их количество.
+    """
+    id: int = Field(..., description="ID заказа")
+    status: str = Field(..., description="Текущий статус заказа")
+    total_amount: Decimal = Field(..., ge=0, description="Общая стоимость")
+    items_count: int = Field(..., ge=0, description="Количество позиций в заказе")
+    total_quantity: int = Field(..., ge=0, description="Общее количество товаров")
+    created_at: datetime = Field(..., description="Когда заказ был создан")
+    updated_at: datetime = Field(..., description="Когда последний раз обновлялся")
+
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderSummaryList(BaseModel):
+    items: list[OrderSummary] = Field(..., description="Заказы на текущей странице, новые сверху")
+    page_size: int = Field(ge=1, description="Размер страницы")
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы (None, если страница последняя)")
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import STOCK_HOLD_TTL, STOCK_HOLD_SWEEP_BATCH_SIZE
+from app.models.products import Product as ProductModel
+from app.models.stock_holds import StockHold
+from app.utils import _stock_shortages
+
+# Первый ключ пары для pg_advisory_xact_lock(key, user_id): брони одного пользователя меняются по очереди
+STOCK_HOLD_LOCK_KEY = 7_340_002
+
+async def lock_stock_holds(db: AsyncSession, user_id: int) -> None:
+    """
+    Берёт advisory-блокировку броней пользователя до конца транзакции.
+    Корзина в Redis берёт её до чтения количества, чтобы бронь и корзина менялись вместе.
+    """
+    await db.execute(select(func.pg_advisory_xact_lock(STOCK_HOLD_LOCK_KEY, user_id)))
+
+async def hold_stock(db: AsyncSession, user_id: int, product_id: int, quantity: int) -> None:
+    """
+    Устанавливает бронь пользователя на товар равной quantity (количеству в корзине)
+    и продлевает её на STOCK_HOLD_TTL. products.reserved меняется на разницу со старой бронью
+    одним условным UPDATE: увеличение проходит, только если stock - reserved хватает.
+    При нехватке транзакция откатывается и выбрасывается 400 со списком позиций, как при оформлении.
+    Commit — за вызывающим кодом.
+    """
+    await lock_stock_holds(db, user_id)
+    # Строка брони блокируется раньше строки товара — в том же порядке, что и при снятии броней
+    held = await db.scalar(
+        select(StockHold.quantity)
+        .where(StockHold.user_id == user_id, StockHold.product_id == product_id)
+        .with_for_update()
+    ) or 0
+
+    delta = quantity - held
+    if delta:
+        stmt = (
+            update(ProductModel)
+            .where(ProductModel.id == product_id)
+            .values(reserved=ProductModel.reserved + delta)
+            .returning(ProductModel.id)
+        )
+        if delta > 0:
+            stmt = stmt.where(ProductModel.is_active == True, ProductModel.stock - ProductModel.reserved >= delta)
+        if await db.scalar(stmt) is None:
+            await db.rollback()
+            shortages = await _stock_shortages(db, [(product_id, quantity)])
+            for shortage in shortages:
+                # Собственная бронь пользователя тоже доступна ему
+                if shortage["reason"] == "insufficient_stock":
+                    shortage["available"] += held
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"message": "Not enough stock to hold", "items": shortages},
+            )
+
+    stmt = pg_insert(StockHold).values(
+        user_id=user_id,
+        product_id=product_id,
+        quantity=quantity,
+        expires_at=func.now() + timedelta(seconds=STOCK_HOLD_TTL),
+    )
+    await db.execute(stmt.on_conflict_do_update(
+        constraint="uq_stock_holds_user_product",
+        set_={"quantity": stmt.excluded.quantity, "expires_at": stmt.excluded.expires_at},
+    ))
+
+async def release_holds(db: AsyncSession, user_id: int, product_ids: list[int] | None = None) -> dict[int, int]:
+    """
+    Снимает брони пользователя (все или по product_ids) и возвращает {product_id: quantity}.
+    При оформлении заказа брони снимаются в его транзакции перед списанием остатков,
+    так что купить забронированное может только владелец брони. Commit — за вызывающим кодом.
+    """
+    stmt = delete(StockHold).where(StockHold.user_id == user_id)
+    if product_ids is not None:
+        stmt = stmt.where(StockHold.product_id.in_(product_ids))
+    released, _ = await _release(db, stmt)
+    return released
+
+async def release_expired_holds(db: AsyncSession, batch_size: int = STOCK_HOLD_SWEEP_BATCH_SIZE) -> int:
+    """
+    Снимает просроченные брони пачками по batch_size, каждая пачка — отдельная транзакция.
+    Брони, занятые параллельной операцией (например, продлением), пропускаются (SKIP LOCKED)
+    и достанутся следующему запуску. Возвращает количество снятых броней.
+    """
+    total = 0
+    while True:
+        expired = (
+            select(StockHold.id)
+            .where(StockHold.expires_at < func.now())
+            .order_by(StockHold.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .cte("expired")
+        )
+        _, holds = await _release(db, delete(StockHold).where(StockHold.id == expired.c.id))
+        await db.commit()
+        total += holds
+        if holds < batch_size:
+            return total
+
+async def _release(db: AsyncSession, delete_stmt) -> tuple[dict[int, int], int]:
+    """
+    Удаляет брони запросом delete_stmt и одним запросом уменьшает products.reserved
+    на их сумму по товарам. Строки товаров блокируются в порядке id, как в _reserve_stock.
+    Возвращает ({product_id: снятое количество}, число снятых броней).
+    """
+    released = delete_stmt.returning(StockHold.product_id, StockHold.quantity).cte("released")
+    totals = (
+        select(
+            released.c.product_id,
+            func.sum(released.c.quantity).label("quantity"),
+            func.count().label("holds"),
+        )
+        .group_by(released.c.product_id)
+        .cte("totals")
+    )
+    locked = (
+        select(ProductModel.id)
+        .join(totals, totals.c.product_id == ProductModel.id)
+        .order_by(ProductModel.id)
+        .with_for_update(of=ProductModel)
+        .cte("locked")
+    )
+    result = await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == locked.c.id, ProductModel.id == totals.c.product_id)
+        .values(reserved=ProductModel.reserved - totals.c.quantity)
+        .returning(ProductModel.id, totals.c.quantity, totals.c.holds)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    return {row.id: row.quantity for row in rows}, sum(row.holds for row in rows)
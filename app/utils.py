@@ -1,51 +1,445 @@
+import base64
+import binascii
+import json
+from collections.abc import Iterable
+from datetime import datetime
 from sqlalchemy.sql import func
-from sqlalchemy import select
+from sqlalchemy import select, or_, insert, update, delete, literal, literal_column, union_all, text, true, values, column, case, tuple_, Integer, Numeric, String
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from app.models.reviews import Review as ReviewModel
+from sqlalchemy.orm import selectinload, aliased
 from fastapi import HTTPException, status
 from app.models.cart_items import CartItem as CartItemModel
-from app.models.products import Product as ProductModel
+from app.models.products import Product as ProductModel, SEARCH_TS_CONFIG
+from app.models.reviews import Review as ReviewModel
+from app.models.categories import Category as CategoryModel, CategoryClosure
 from app.models.orders import Order as OrderModel, OrderItem as OrderItemModel
+from app.models.stock_slots import ProductStockSlot
+from app.cache import TTLCache
+from app.versions import bump_version
+from app.category_tree import category_tree_cache
+from app.product_cache import product_cache, PRODUCT_SCHEMA_COLUMNS, _product_from_row
+from app.ratings import invalidate_product_ratings
+from app.config import (
+    PRODUCT_SEARCH_MODE,
+    PRODUCT_COUNT_MODE,
+    PRODUCT_COUNT_ESTIMATE_THRESHOLD,
+    PRODUCT_COUNT_CACHE_TTL,
+    PRODUCT_COUNT_CACHE_SIZE,
+    PRODUCT_BULK_BATCH_SIZE,
+    CART_BACKEND,
+    STOCK_HOLDS_ENABLED,
+)
+
+# Кэш total для GET /products/, ключ — нормализованный набор фильтров
+product_count_cache = TTLCache(maxsize=PRODUCT_COUNT_CACHE_SIZE, ttl=PRODUCT_COUNT_CACHE_TTL)
+
+def _active_product_cte(product_id: int):
+    return select(*PRODUCT_SCHEMA_COLUMNS).where(
+        ProductModel.id == product_id,
+        ProductModel.is_active == True,
+    ).cte("product")
 
-async def update_product_rating(db: AsyncSession, product_id: int):
+async def _cart_add_item(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    """
+    Добавляет товар в корзину или увеличивает его количество одним запросом:
+    INSERT ... SELECT из активного товара ON CONFLICT (user_id, product_id) DO UPDATE ... RETURNING.
+    Увеличение атомарно, поэтому параллельные добавления не теряются.
+    Возвращает строку позиции вместе с полями товара или None, если товар не найден или неактивен.
+    """
+    product = _active_product_cte(product_id)
+    stmt = pg_insert(CartItemModel).from_select(
+        ["user_id", "product_id", "quantity"],
+        select(literal(user_id), product.c.id, literal(quantity)),
+    )
+    upsert = stmt.on_conflict_do_update(
+        constraint="uq_cart_items_user_product",
+        set_={"quantity": CartItemModel.quantity + stmt.excluded.quantity, "updated_at": func.now()},
+    ).returning(CartItemModel.id, CartItemModel.quantity).cte("upsert")
     result = await db.execute(
-        select(func.avg(ReviewModel.grade)).where(
-            ReviewModel.product_id == product_id,
-            ReviewModel.is_active == True
-        )
+        select(upsert.c.id.label("item_id"), upsert.c.quantity.label("item_quantity"), *product.c)
+        .select_from(upsert)
+        .join(product, true())
     )
-    avg_rating = result.scalar() or 0.0
-    product = await db.get(ProductModel, product_id)
-    product.rating = avg_rating
-    await db.commit()
+    return result.first()
 
-async def _ensure_product_available(db: AsyncSession, product_id: int) -> None:
-    result = await db.scalars(
-        select(ProductModel).where(
-            ProductModel.id == product_id,
+async def _cart_set_quantity(db: AsyncSession, user_id: int, product_id: int, quantity: int):
+    """
+    Устанавливает количество товара в корзине одним UPDATE ... FROM активного товара.
+    Возвращает None, если товар не найден или неактивен; если товар есть, а позиции нет,
+    item_id в строке равен None.
+    """
+    product = _active_product_cte(product_id)
+    updated = (
+        update(CartItemModel)
+        .where(CartItemModel.user_id == user_id, CartItemModel.product_id == product.c.id)
+        .values(quantity=quantity, updated_at=func.now())
+        .returning(CartItemModel.id, CartItemModel.quantity)
+        .cte("updated")
+    )
+    result = await db.execute(
+        select(updated.c.id.label("item_id"), updated.c.quantity.label("item_quantity"), *product.c)
+        .select_from(product)
+        .outerjoin(updated, true())
+    )
+    return result.first()
+
+async def _cart_remove_item(db: AsyncSession, user_id: int, product_id: int) -> bool:
+    """
+    Удаляет товар из корзины одним DELETE ... RETURNING; False, если позиции не было.
+    """
+    deleted = await db.scalar(
+        delete(CartItemModel)
+        .where(CartItemModel.user_id == user_id, CartItemModel.product_id == product_id)
+        .returning(CartItemModel.id)
+    )
+    return deleted is not None
+
+def _cart_item_from_row(row) -> dict:
+    """
+    Собирает ответ CartItem из строки _cart_add_item / _cart_set_quantity без повторного запроса.
+    """
+    return {
+        "id": row.item_id,
+        "quantity": row.item_quantity,
+        "product": _product_from_row(row),
+    }
+
+async def _reserve_stock(db: AsyncSession, lines: list[tuple[int, int]]) -> dict:
+    """
+    Списывает остатки по строкам (product_id, quantity) одним условным UPDATE:
+    UPDATE products SET stock = stock - v.qty FROM (VALUES ...) v WHERE stock - reserved >= v.qty RETURNING.
+    Строки товаров предварительно блокируются в порядке id, чтобы параллельные заказы
+    с пересекающимися товарами не попадали во взаимную блокировку.
+    Товары со слотами остатка (stock_slots > 0) списываются из слотов без блокировки строки products.
+    Если хотя бы одну строку списать нельзя, транзакция откатывается и выбрасывается
+    400 со списком проблемных позиций. Возвращает {product_id: строка с полями PRODUCT_SCHEMA_COLUMNS}
+    (остаток — уже после списания).
+    """
+    requested = values(
+        column("product_id", Integer), column("qty", Integer), name="v"
+    ).data(sorted(lines))
+    locked = (
+        select(ProductModel.id)
+        .join(requested, requested.c.product_id == ProductModel.id)
+        .where(ProductModel.stock_slots == 0)
+        .order_by(ProductModel.id)
+        .with_for_update(of=ProductModel)
+        .cte("locked")
+    )
+    result = await db.execute(
+        update(ProductModel)
+        .where(
+            ProductModel.id == locked.c.id,
+            ProductModel.id == requested.c.product_id,
             ProductModel.is_active == True,
+            # Забронированное под чужие корзины не продаётся; свои брони сняты до вызова
+            ProductModel.stock - ProductModel.reserved >= requested.c.qty,
         )
+        .values(stock=ProductModel.stock - requested.c.qty)
+        .returning(*PRODUCT_SCHEMA_COLUMNS)
     )
-    product = result.first()
-    if not product:
+    reserved = {row.id: row for row in result}
+    if len(reserved) < len(lines):
+        reserved.update(await _reserve_slot_stock(db, [line for line in lines if line[0] not in reserved]))
+    if len(reserved) < len(lines):
+        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found or inactive",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "Some items cannot be ordered",
+                "items": await _stock_shortages(db, [line for line in lines if line[0] not in reserved]),
+            },
+        )
+    return reserved
+
+async def _reserve_slot_stock(db: AsyncSession, lines: list[tuple[int, int]]) -> dict:
+    """
+    Списывает остатки товаров со слотами; для остальных строк ничего не делает.
+    Возвращает {product_id: строка с полями PRODUCT_SCHEMA_COLUMNS} для списанных позиций
+    (stock в строке — последняя синхронизированная сумма слотов).
+    """
+    products = await db.execute(
+        select(*PRODUCT_SCHEMA_COLUMNS).where(
+            ProductModel.id.in_([product_id for product_id, _ in lines]),
+            ProductModel.is_active == True,
+            ProductModel.stock_slots > 0,
         )
+    )
+    products = {row.id: row for row in products}
+    reserved = {}
+    # Товары обходятся в порядке id, как и при блокировке строк products
+    for product_id, quantity in sorted(lines):
+        if product_id in products and await _take_slot_stock(db, product_id, quantity):
+            reserved[product_id] = products[product_id]
+    return reserved
+
+async def _take_slot_stock(db: AsyncSession, product_id: int, quantity: int) -> bool:
+    """
+    Списывает quantity из слотов товара. Быстрый путь — случайный слот с достаточным остатком,
+    занятые другими транзакциями слоты пропускаются (SKIP LOCKED). Если такого нет, все слоты
+    блокируются по порядку и списание раскладывается по нескольким из них.
+    Возвращает False, если суммы слотов не хватает.
+    """
+    candidate = (
+        select(ProductStockSlot.slot)
+        .where(ProductStockSlot.product_id == product_id, ProductStockSlot.stock >= quantity)
+        .order_by(func.random())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .cte("candidate")
+    )
+    taken = await db.scalar(
+        update(ProductStockSlot)
+        .where(ProductStockSlot.product_id == product_id, ProductStockSlot.slot == candidate.c.slot)
+        .values(stock=ProductStockSlot.stock - quantity)
+        .returning(ProductStockSlot.slot)
+        .execution_options(synchronize_session=False)
+    )
+    if taken is not None:
+        return True
+
+    slots = (await db.execute(
+        select(ProductStockSlot.slot, ProductStockSlot.stock)
+        .where(ProductStockSlot.product_id == product_id)
+        .order_by(ProductStockSlot.slot)
+        .with_for_update()
+    )).all()
+    if sum(slot.stock for slot in slots) < quantity:
+        return False
+
+    remaining, taken_from = quantity, []
+    for slot in sorted(slots, key=lambda slot: slot.stock, reverse=True):
+        if remaining == 0:
+            break
+        take = min(slot.stock, remaining)
+        taken_from.append((slot.slot, take))
+        remaining -= take
+    takes = values(column("slot", Integer), column("qty", Integer), name="t").data(taken_from)
+    await db.execute(
+        update(ProductStockSlot)
+        .where(ProductStockSlot.product_id == product_id, ProductStockSlot.slot == takes.c.slot)
+        .values(stock=ProductStockSlot.stock - takes.c.qty)
+        .execution_options(synchronize_session=False)
+    )
+    return True
 
-async def _get_cart_item(
-    db: AsyncSession, user_id: int, product_id: int
-) -> CartItemModel | None:
+async def _set_stock_slots(db: AsyncSession, product_id: int, slots: int) -> None:
+    """
+    Переводит товар в режим с slots слотами остатка (0 — обычный режим). Текущие слоты
+    блокируются, их сумма становится products.stock и заново раскладывается по новым слотам.
+    Commit — за вызывающим кодом.
+    """
+    current = (await db.scalars(
+        select(ProductStockSlot.stock)
+        .where(ProductStockSlot.product_id == product_id)
+        .order_by(ProductStockSlot.slot)
+        .with_for_update()
+    )).all()
+    changes = {"stock_slots": slots}
+    if current:
+        changes["stock"] = sum(current)
+    await db.execute(update(ProductModel).where(ProductModel.id == product_id).values(**changes))
+    await _redistribute_stock_slots(db, [product_id])
+
+async def _redistribute_stock_slots(db: AsyncSession, product_ids: Iterable[int]) -> None:
+    """
+    Раскладывает products.stock товаров со слотами поровну по stock_slots слотам
+    (остаток от деления — в первые слоты). Вызывается после того, как продавец задал остаток.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    await db.execute(delete(ProductStockSlot).where(ProductStockSlot.product_id.in_(product_ids)))
+    expanded = (
+        select(
+            ProductModel.id,
+            ProductModel.stock,
+            ProductModel.stock_slots,
+            func.generate_series(0, ProductModel.stock_slots - 1).label("slot"),
+        )
+        .where(ProductModel.id.in_(product_ids), ProductModel.stock_slots > 0)
+        .subquery("expanded")
+    )
+    share = expanded.c.stock // expanded.c.stock_slots + case(
+        (expanded.c.slot < expanded.c.stock % expanded.c.stock_slots, 1), else_=0
+    )
+    await db.execute(
+        insert(ProductStockSlot).from_select(
+            ["product_id", "slot", "stock"],
+            select(expanded.c.id, expanded.c.slot, share),
+        )
+    )
+
+async def _sync_stock_slots(db: AsyncSession) -> list[int]:
+    """
+    Переносит сумму слотов в products.stock для товаров, у которых она разошлась.
+    Строки товаров со слотами сначала блокируются в порядке id, и суммы считаются следующим
+    запросом: его снимок видит слоты, заново разложенные продавцом, который держал
+    блокировку строки, и старая сумма не перетирает новый остаток.
+    Возвращает id обновлённых товаров. Commit — за вызывающим кодом.
+    """
+    await db.execute(
+        select(ProductModel.id)
+        .where(ProductModel.stock_slots > 0)
+        .order_by(ProductModel.id)
+        .with_for_update()
+    )
+    totals = (
+        select(ProductStockSlot.product_id, func.sum(ProductStockSlot.stock).label("stock"))
+        .group_by(ProductStockSlot.product_id)
+        .subquery("totals")
+    )
     result = await db.scalars(
-        select(CartItemModel)
-        .options(selectinload(CartItemModel.product))
+        update(ProductModel)
         .where(
-            CartItemModel.user_id == user_id,
-            CartItemModel.product_id == product_id,
+            ProductModel.id == totals.c.product_id,
+            ProductModel.stock_slots > 0,
+            ProductModel.stock != totals.c.stock,
         )
+        .values(stock=totals.c.stock)
+        .returning(ProductModel.id)
+        .execution_options(synchronize_session=False)
     )
-    return result.first()
+    return result.all()
+
+async def _fold_stock_slots(db: AsyncSession) -> list[int]:
+    """
+    Выключает слоты у всех товаров: сумма слотов становится products.stock, слоты удаляются.
+    Строки товаров и слотов блокируются в том же порядке, что и при обновлении остатка продавцом,
+    поэтому списания из слотов, закоммиченные до блокировки, попадают в сумму.
+    Возвращает id изменённых товаров. Commit — за вызывающим кодом.
+    """
+    product_ids = (await db.scalars(
+        select(ProductModel.id)
+        .where(ProductModel.stock_slots > 0)
+        .order_by(ProductModel.id)
+        .with_for_update()
+    )).all()
+    if not product_ids:
+        return []
+    await db.execute(
+        select(ProductStockSlot.product_id)
+        .where(ProductStockSlot.product_id.in_(product_ids))
+        .order_by(ProductStockSlot.product_id, ProductStockSlot.slot)
+        .with_for_update()
+    )
+    totals = (
+        select(ProductStockSlot.product_id, func.sum(ProductStockSlot.stock).label("stock"))
+        .where(ProductStockSlot.product_id.in_(product_ids))
+        .group_by(ProductStockSlot.product_id)
+        .subquery("totals")
+    )
+    await db.execute(
+        update(ProductModel)
+        .where(ProductModel.id == totals.c.product_id)
+        .values(stock=totals.c.stock, stock_slots=0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(delete(ProductStockSlot).where(ProductStockSlot.product_id.in_(product_ids)))
+    return list(product_ids)
+
+async def _stock_shortages(db: AsyncSession, lines: list[tuple[int, int]]) -> list[dict]:
+    """
+    Описывает позиции, которые не удалось списать: товар недоступен или остатка не хватает.
+    """
+    products = {
+        row.id: row for row in await db.execute(
+            select(ProductModel.id, ProductModel.stock, ProductModel.reserved, ProductModel.is_active)
+            .where(ProductModel.id.in_([product_id for product_id, _ in lines]))
+        )
+    }
+    shortages = []
+    for product_id, quantity in lines:
+        product = products.get(product_id)
+        if product is None or not product.is_active:
+            shortages.append({"product_id": product_id, "requested": quantity, "available": 0, "reason": "unavailable"})
+        else:
+            available = max(product.stock - product.reserved, 0)
+            shortages.append({"product_id": product_id, "requested": quantity, "available": available, "reason": "insufficient_stock"})
+    return shortages
+
+async def _create_order(db: AsyncSession, user_id: int, lines: list[tuple[int, int]], reserved: dict) -> dict:
+    """
+    Создаёт заказ и все его позиции одним запросом: INSERT заказа с total_amount,
+    посчитанным в том же запросе, и многострочный INSERT позиций, оба с RETURNING.
+    Возвращает данные для схемы Order, собранные без повторного чтения.
+    """
+    order_lines = select(
+        values(
+            column("position", Integer),
+            column("product_id", Integer),
+            column("product_name", String(100)),
+            column("quantity", Integer),
+            column("unit_price", Numeric(10, 2)),
+            name="v",
+        ).data([
+            (position, product_id, reserved[product_id].name, quantity, reserved[product_id].price)
+            for position, (product_id, quantity) in enumerate(lines)
+        ])
+    ).cte("order_lines")
+    line_total = order_lines.c.quantity * order_lines.c.unit_price
+
+    order_row = (
+        insert(OrderModel)
+        .from_select(
+            ["user_id", "status", "total_amount"],
+            select(literal(user_id), literal("pending"), func.sum(line_total)),
+        )
+        .returning(
+            OrderModel.id, OrderModel.user_id, OrderModel.status, OrderModel.total_amount,
+            OrderModel.created_at, OrderModel.updated_at,
+        )
+        .cte("order_row")
+    )
+    items = (
+        insert(OrderItemModel)
+        .from_select(
+            ["order_id", "product_id", "product_name", "quantity", "unit_price", "total_price"],
+            select(
+                order_row.c.id, order_lines.c.product_id, order_lines.c.product_name,
+                order_lines.c.quantity, order_lines.c.unit_price, line_total,
+            )
+            .select_from(order_row)
+            .join(order_lines, true())
+            .order_by(order_lines.c.position),
+        )
+        .returning(
+            OrderItemModel.id, OrderItemModel.product_id, OrderItemModel.quantity,
+            OrderItemModel.unit_price, OrderItemModel.total_price,
+        )
+        .cte("items")
+    )
+    rows = (await db.execute(
+        select(order_row, items.c.id.label("item_id"), items.c.product_id, items.c.quantity,
+               items.c.unit_price, items.c.total_price)
+        .select_from(order_row)
+        .join(items, true())
+    )).all()
+
+    items_by_product = {row.product_id: row for row in rows}
+    order = rows[0]
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "status": order.status,
+        "total_amount": order.total_amount,
+        "created_at": order.created_at,
+        "updated_at": order.updated_at,
+        "items": [
+            {
+                "id": items_by_product[product_id].item_id,
+                "product_id": product_id,
+                "product_name": reserved[product_id].name,
+                "quantity": items_by_product[product_id].quantity,
+                "unit_price": items_by_product[product_id].unit_price,
+                "total_price": items_by_product[product_id].total_price,
+                "product": _product_from_row(reserved[product_id]),
+            }
+            for product_id, _ in lines
+        ],
+    }
 
 async def _load_order_with_items(db: AsyncSession, order_id: int) -> OrderModel | None:
     result = await db.scalars(
@@ -55,4 +449,353 @@ async def _load_order_with_items(db: AsyncSession, order_id: int) -> OrderModel
         )
         .where(OrderModel.id == order_id)
     )
-    return result.first()
\ No newline at end of file
+    return result.first()
+
+def _encode_cursor(*values) -> str:
+    """
+    Упаковывает ключ сортировки последней выданной записи в непрозрачный курсор.
+    """
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, *types) -> list:
+    """
+    Распаковывает курсор и приводит каждое значение ключа к ожидаемому типу.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [cast(value) for cast, value in zip(types, values)]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+# Порядки выдачи отзывов: ключ сортировки (все колонки по убыванию) и типы значений курсора
+REVIEW_SORTS = {
+    "newest": ((ReviewModel.comment_date, ReviewModel.id), (datetime.fromisoformat, int)),
+    "grade": ((ReviewModel.grade, ReviewModel.comment_date, ReviewModel.id), (int, datetime.fromisoformat, int)),
+}
+
+def _review_page(stmt, sort: str, cursor: str | None, entity=ReviewModel):
+    """
+    Упорядочивает выборку отзывов по ключу sort и продолжает её сразу после записи
+    из cursor — одним сравнением строк по ключу, которое обслуживается индексом.
+    entity — модель отзыва или её алиас, по колонкам которого идёт сортировка.
+    """
+    columns = [getattr(entity, column.key) for column in REVIEW_SORTS[sort][0]]
+    if cursor is not None:
+        stmt = stmt.where(tuple_(*columns) < tuple_(*_decode_cursor(cursor, *REVIEW_SORTS[sort][1])))
+    return stmt.order_by(*(column.desc() for column in columns))
+
+def _review_cursor(review, sort: str) -> str:
+    """
+    Курсор, продолжающий выдачу после отзыва review в порядке sort.
+    """
+    return _encode_cursor(*(getattr(review, column.key) for column in REVIEW_SORTS[sort][0]))
+
+def _product_search(term: str, mode: str = PRODUCT_SEARCH_MODE):
+    """
+    Строит условие поиска товаров и выражение релевантности.
+    В режиме "fulltext" ищет по tsvector (название + описание) и по триграммному
+    сходству с названием, что прощает опечатки; оба условия обслуживаются GIN-индексами.
+    В режиме "like" ранга нет (None) и сохраняется прежний поиск подстроки.
+    """
+    if mode != "fulltext":
+        return ProductModel.name.ilike(f"%{term}%"), None
+
+    ts_query = func.websearch_to_tsquery(SEARCH_TS_CONFIG, term)
+    condition = or_(
+        ProductModel.search_vector.op("@@")(ts_query),
+        ProductModel.name.op("%>")(term),  # word_similarity(term, name) выше порога pg_trgm
+    )
+    rank = func.ts_rank_cd(ProductModel.search_vector, ts_query) + func.word_similarity(term, ProductModel.name)
+    return condition, rank
+
+async def _explain(db: AsyncSession, stmt, analyze: bool = False) -> dict:
+    """
+    Выполняет EXPLAIN (FORMAT JSON) для запроса с его параметрами и возвращает описание плана.
+    """
+    conn = await db.connection()
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    result = await conn.exec_driver_sql(
+        f"EXPLAIN ({options}) {compiled.string}",
+        tuple(params[name] for name in compiled.positiontup or ()),
+    )
+    return result.scalar()[0]
+
+async def _count_products(db: AsyncSession, filters: list, signature: tuple) -> tuple[int, bool]:
+    """
+    Возвращает (total, estimated) для набора фильтров товаров.
+    Результат кэшируется по signature (в неё входят версии каталога, поэтому изменения
+    из других процессов, например фоновых задач, не отдают старый total). В режиме "estimated" большие выборки
+    оцениваются по статистике планировщика вместо полного COUNT.
+    """
+    cached = product_count_cache.get(signature)
+    if cached is not None:
+        return cached
+
+    result = None
+    if PRODUCT_COUNT_MODE == "estimated":
+        plan = await _explain(db, select(ProductModel.id).where(*filters))
+        estimate = int(plan["Plan"]["Plan Rows"])
+        if estimate >= PRODUCT_COUNT_ESTIMATE_THRESHOLD:
+            result = (estimate, True)
+
+    if result is None:
+        total = await db.scalar(select(func.count()).select_from(ProductModel).where(*filters)) or 0
+        result = (total, False)
+
+    product_count_cache.set(signature, result)
+    return result
+
+async def _invalidate_products(db: AsyncSession, product_ids: Iterable[int] = (), redis=None) -> None:
+    """
+    Сбрасывает производные данные каталога после закоммиченного изменения товаров:
+    кэш total, версию таблицы для ETag, кэш распределения оценок и закэшированные
+    для корзины товары product_ids. Задачи Celery передают свой клиент redis.
+    """
+    product_ids = list(product_ids)
+    product_count_cache.clear()
+    await bump_version(db, "products")
+    await invalidate_product_ratings(product_ids, redis)
+    if CART_BACKEND == "redis":
+        await product_cache.invalidate(product_ids, redis)
+
+async def _invalidate_reviews(db: AsyncSession, product_ids: Iterable[int]) -> None:
+    """
+    Сбрасывает производные данные после закоммиченного изменения отзывов о товарах product_ids:
+    версии отзывов и товаров для ETag (средняя оценка входит в ответ товара), кэш распределения
+    оценок и закэшированные для корзины товары. Кэш total не сбрасывается — отзывы не меняют состав выборок.
+    """
+    product_ids = list(product_ids)
+    await bump_version(db, "reviews")
+    await bump_version(db, "products")
+    await invalidate_product_ratings(product_ids)
+    if CART_BACKEND == "redis":
+        await product_cache.invalidate(product_ids)
+
+async def _invalidate_categories(db: AsyncSession) -> None:
+    """
+    Сбрасывает производные данные после закоммиченного изменения категорий.
+    От иерархии зависят выборки товаров по поддереву, поэтому сбрасывается и кэш total.
+    """
+    product_count_cache.clear()
+    await bump_version(db, "categories")
+    category_tree_cache.invalidate()
+
+def _category_filter(category_id: int, include_subcategories: bool):
+    """
+    Условие на товары категории: только её самой или всего её поддерева (через таблицу замыкания).
+    """
+    if not include_subcategories:
+        return ProductModel.category_id == category_id
+    return ProductModel.category_id.in_(
+        select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+    )
+
+def _product_filters(
+    category_id: int | None = None,
+    include_subcategories: bool = True,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool | None = None,
+    seller_id: int | None = None,
+    created_at=None,
+) -> list:
+    """
+    Собирает условия выборки активных товаров по фильтрам каталога (кроме поиска).
+    """
+    # Проверка логики min_price <= max_price
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price не может быть больше max_price",
+        )
+
+    filters = [ProductModel.is_active == True]
+
+    if category_id is not None:
+        filters.append(_category_filter(category_id, include_subcategories))
+
+    if min_price is not None:
+        filters.append(ProductModel.price >= min_price)
+
+    if max_price is not None:
+        filters.append(ProductModel.price <= max_price)
+
+    if in_stock is not None:
+        if STOCK_HOLDS_ENABLED:
+            # В наличии — то, что не занято бронями корзин: stock - reserved > 0
+            filters.append(ProductModel.stock > ProductModel.reserved if in_stock else ProductModel.stock <= ProductModel.reserved)
+        else:
+            filters.append(ProductModel.stock > 0 if in_stock else ProductModel.stock == 0)
+
+    if seller_id is not None:
+        filters.append(ProductModel.seller_id == seller_id)
+
+    if created_at is not None:
+        filters.append(ProductModel.created_at >= created_at)
+
+    return filters
+
+# Ключ advisory-блокировки, сериализующей изменения иерархии категорий
+CATEGORY_TREE_LOCK_KEY = 7_340_001
+
+async def _lock_category_tree(db: AsyncSession) -> None:
+    """
+    Сериализует изменения таблицы замыкания до конца транзакции: параллельные переносы
+    одного поддерева иначе могут оставить в ней несогласованные пути.
+    """
+    await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CATEGORY_TREE_LOCK_KEY})
+
+async def _closure_add(db: AsyncSession, category_id: int, parent_id: int | None) -> None:
+    """
+    Добавляет в таблицу замыкания новую категорию: строку на себя и по строке на каждого предка родителя.
+    """
+    await _lock_category_tree(db)
+    rows = select(literal(category_id), literal(category_id), literal(0))
+    if parent_id is not None:
+        rows = union_all(
+            rows,
+            select(CategoryClosure.ancestor_id, literal(category_id), CategoryClosure.depth + 1)
+            .where(CategoryClosure.descendant_id == parent_id),
+        )
+    await db.execute(
+        insert(CategoryClosure).from_select(["ancestor_id", "descendant_id", "depth"], rows)
+    )
+
+async def _closure_detach(db: AsyncSession, category_id: int) -> None:
+    """
+    Отвязывает поддерево категории от всех её предков; связи внутри поддерева сохраняются.
+    """
+    await _lock_category_tree(db)
+    subtree = select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+    await db.execute(
+        delete(CategoryClosure).where(
+            CategoryClosure.descendant_id.in_(subtree),
+            CategoryClosure.ancestor_id.not_in(subtree),
+        )
+    )
+
+async def _closure_move(db: AsyncSession, category_id: int, parent_id: int | None) -> None:
+    """
+    Переносит поддерево категории под нового родителя (или в корень, если parent_id is None).
+    """
+    await _closure_detach(db, category_id)
+    if parent_id is None:
+        return
+    ancestors = aliased(CategoryClosure)
+    subtree = aliased(CategoryClosure)
+    await db.execute(
+        insert(CategoryClosure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(ancestors.ancestor_id, subtree.descendant_id, ancestors.depth + subtree.depth + 1)
+            .select_from(ancestors)
+            .join(subtree, true())
+            .where(ancestors.descendant_id == parent_id, subtree.ancestor_id == category_id),
+        )
+    )
+
+async def _is_in_subtree(db: AsyncSession, category_id: int, root_id: int) -> bool:
+    """
+    Проверяет, входит ли категория в поддерево root_id (включая сам root_id).
+    """
+    found = await db.scalar(
+        select(CategoryClosure.depth).where(
+            CategoryClosure.ancestor_id == root_id,
+            CategoryClosure.descendant_id == category_id,
+        )
+    )
+    return found is not None
+
+
+# Поля товара, которые массовая загрузка перезаписывает у существующего товара
+BULK_UPDATE_FIELDS = ("name", "description", "price", "image_url", "stock", "category_id")
+
+async def _bulk_upsert_products(db: AsyncSession, seller_id: int, items: list) -> list[dict]:
+    """
+    Создаёт и обновляет товары продавца пачками многострочных INSERT ... RETURNING.
+    Позиции с client_key идут через ON CONFLICT (seller_id, client_key) DO UPDATE,
+    без ключа — обычной вставкой. Категории проверяются одним запросом для всех позиций.
+    Каждая пачка выполняется в своей точке сохранения: ошибка БД помечает failed только её позиции.
+    Возвращает результат для каждой позиции в порядке запроса; commit — за вызывающим кодом.
+    """
+    results: list[dict | None] = [None] * len(items)
+
+    category_ids = {item.category_id for item in items}
+    active_categories = set(await db.scalars(
+        select(CategoryModel.id).where(CategoryModel.id.in_(category_ids), CategoryModel.is_active == True)
+    )) if category_ids else set()
+
+    keyed, unkeyed, seen_keys = [], [], set()
+    for index, item in enumerate(items):
+        if item.category_id not in active_categories:
+            results[index] = _bulk_failed(index, item.client_key, "Category not found or inactive")
+        elif item.client_key is not None and item.client_key in seen_keys:
+            # Одна строка не может обновиться дважды в одном ON CONFLICT DO UPDATE
+            results[index] = _bulk_failed(index, item.client_key, "Duplicate client_key in request")
+        else:
+            row = item.model_dump()
+            row.update(seller_id=seller_id, is_active=True)
+            if item.client_key is not None:
+                seen_keys.add(item.client_key)
+                keyed.append((index, row))
+            else:
+                unkeyed.append((index, row))
+
+    # Единый порядок ключей снижает риск взаимных блокировок параллельных загрузок
+    keyed.sort(key=lambda entry: entry[1]["client_key"])
+    for chunk in _chunks(keyed, PRODUCT_BULK_BATCH_SIZE):
+        stmt = pg_insert(ProductModel).values([row for _, row in chunk])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductModel.seller_id, ProductModel.client_key],
+            index_where=ProductModel.client_key.is_not(None),
+            set_={
+                **{field: stmt.excluded[field] for field in BULK_UPDATE_FIELDS},
+                "is_active": True,
+                "updated_at": func.now(),
+            },
+        ).returning(ProductModel.client_key, ProductModel.id, literal_column("xmax = 0"))
+        try:
+            async with db.begin_nested():
+                returned = {key: (product_id, inserted) for key, product_id, inserted in await db.execute(stmt)}
+        except DBAPIError as exc:
+            _bulk_fail_chunk(results, chunk, exc)
+            continue
+        for index, row in chunk:
+            product_id, inserted = returned[row["client_key"]]
+            results[index] = _bulk_result(index, row["client_key"], "created" if inserted else "updated", product_id)
+
+    for chunk in _chunks(unkeyed, PRODUCT_BULK_BATCH_SIZE):
+        stmt = insert(ProductModel).returning(ProductModel.id, sort_by_parameter_order=True)
+        try:
+            async with db.begin_nested():
+                product_ids = (await db.execute(stmt, [row for _, row in chunk])).scalars().all()
+        except DBAPIError as exc:
+            _bulk_fail_chunk(results, chunk, exc)
+            continue
+        for (index, _), product_id in zip(chunk, product_ids):
+            results[index] = _bulk_result(index, None, "created", product_id)
+
+    return results
+
+def _chunks(entries: list, size: int):
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+def _bulk_result(index: int, client_key: str | None, status_: str, product_id: int | None = None, error: str | None = None) -> dict:
+    return {"index": index, "client_key": client_key, "status": status_, "product_id": product_id, "error": error}
+
+def _bulk_failed(index: int, client_key: str | None, error: str) -> dict:
+    return _bulk_result(index, client_key, "failed", error=error)
+
+def _bulk_fail_chunk(results: list, chunk: list, exc: DBAPIError) -> None:
+    error = str(exc.orig).splitlines()[0] if exc.orig is not None else "Database error"
+    for index, row in chunk:
+        results[index] = _bulk_failed(index, row["client_key"], error)
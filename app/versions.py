@@ -0,0 +1,31 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Таблицы, для которых ведётся счётчик версий (последовательность <table>_version_seq).
+# Последовательности не блокируют строки, поэтому частые записи не выстраиваются в очередь
+# за общим счётчиком, а nextval не откатывается вместе с транзакцией.
+VERSIONED_TABLES = ("products", "categories", "reviews", "users")
+
+async def get_versions(db: AsyncSession, *tables: str) -> tuple[int, ...]:
+    """
+    Возвращает текущие версии указанных таблиц одним запросом.
+    """
+    # Первый nextval не меняет last_value, а только выставляет is_called
+    columns = ", ".join(
+        f"(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {_sequence(table)})"
+        for table in tables
+    )
+    row = (await db.execute(text(f"SELECT {columns}"))).one()
+    return tuple(row)
+
+async def bump_version(db: AsyncSession, table: str) -> None:
+    """
+    Увеличивает версию таблицы. Вызывается после commit, чтобы читатели не увидели
+    новую версию раньше новых данных.
+    """
+    await db.execute(text(f"SELECT nextval('{_sequence(table)}')"))
+
+def _sequence(table: str) -> str:
+    if table not in VERSIONED_TABLES:
+        raise ValueError(f"Unknown versioned table: {table}")
+    return f"{table}_version_seq"
@@ -0,0 +1,86 @@
+"""
+Запросы к БД на аутентифицированный запрос: без кэша пользователей и с кэшем principal_cache.
+
+Покупатели по очереди запрашивают GET /cart/summary (итоги корзины сами берутся из кэша),
+поэтому без кэша пользователей на запрос приходится один SELECT из users, а с кэшем —
+только редкая сверка версии пользователей. В конце проверяется, что блокировка
+пользователя в БД отзывает его запись в кэше.
+
+Запуск:
+    python -m benchmarks.auth_queries --buyers 50 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+import httpx
+from sqlalchemy import event, update
+from app.auth import create_access_token
+from app.database import async_engine
+from app.main import app
+from app.models import User as UserModel
+from app.principal_cache import principal_cache
+from app.versions import bump_version
+from benchmarks.seed import BENCH_BUYER_EMAIL, make_session_maker, seed_buyers
+
+async def _run(client: httpx.AsyncClient, headers: list[dict], requests: int, queries: list) -> tuple[float, float]:
+    queries.clear()
+    started = time.perf_counter()
+    for number in range(requests):
+        response = await client.get("/cart/summary", headers=headers[number % len(headers)])
+        assert response.status_code == 200, response.text
+    elapsed = time.perf_counter() - started
+    return len(queries) / requests, requests / elapsed
+
+async def main(buyers: int, requests: int) -> None:
+    session_maker = make_session_maker()
+    async with session_maker() as session:
+        buyer_ids = await seed_buyers(session, buyers)
+    headers = [
+        {"Authorization": "Bearer " + create_access_token(
+            {"sub": BENCH_BUYER_EMAIL.format(number), "role": "buyer", "id": buyer_id}
+        )}
+        for number, buyer_id in enumerate(buyer_ids, start=1)
+    ]
+
+    async_engine.sync_engine.echo = False
+    queries = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # Прогрев: итоги корзин попадают в кэш, чтобы считались только запросы аутентификации
+        await _run(client, headers, len(headers), queries)
+
+        print(f"{'mode':>10} {'queries/request':>16} {'requests/s':>11}")
+        for mode, enabled in (("no cache", False), ("cache", True)):
+            principal_cache.enabled = enabled
+            principal_cache.clear()
+            per_request, rate = await _run(client, headers, requests, queries)
+            print(f"{mode:>10} {per_request:>16.3f} {rate:>11.0f}")
+
+        # Блокировка пользователя отзывает запись кэша не позже чем через check_interval.
+        # Версия увеличивается и после commit: запись, загруженная между срабатыванием триггера
+        # и видимостью изменения, сбрасывается вместе со всем кэшем
+        async with session_maker() as session:
+            await session.execute(update(UserModel).where(UserModel.id == buyer_ids[0]).values(is_active=False))
+            await session.commit()
+            await bump_version(session, "users")
+        await asyncio.sleep(principal_cache.check_interval)
+        status_code = (await client.get("/cart/summary", headers=headers[0])).status_code
+        async with session_maker() as session:
+            await session.execute(update(UserModel).where(UserModel.id == buyer_ids[0]).values(is_active=True))
+            await session.commit()
+            await bump_version(session, "users")
+        print(f"deactivated user after {principal_cache.check_interval:g}s: HTTP {status_code}")
+        assert status_code == 401, "deactivated user is still served from the cache"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=50, help="Сколько разных пользователей делают запросы")
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов в каждом режиме")
+    args = parser.parse_args()
+    asyncio.run(main(args.buyers, args.requests))
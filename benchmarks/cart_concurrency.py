@@ -0,0 +1,83 @@
+"""
+Проверка конкурентных добавлений в корзину: N параллельных запросов увеличивают
+количество одного и того же товара у одного покупателя.
+
+Сравниваются прежний путь (SELECT позиции, изменение в Python, commit) и
+атомарный INSERT ... ON CONFLICT DO UPDATE из _cart_add_item. У атомарного пути
+итоговое количество должно совпасть с числом добавлений.
+
+Запуск:
+    python -m benchmarks.cart_concurrency --adds 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from app.models import CartItem as CartItemModel, Product as ProductModel
+from app.utils import _cart_add_item
+from benchmarks.seed import make_session_maker, seed_buyers, seed_catalog
+
+async def _legacy_add(session, user_id: int, product_id: int) -> None:
+    cart_item = await session.scalar(
+        select(CartItemModel).where(CartItemModel.user_id == user_id, CartItemModel.product_id == product_id)
+    )
+    if cart_item:
+        cart_item.quantity += 1
+    else:
+        session.add(CartItemModel(user_id=user_id, product_id=product_id, quantity=1))
+    await session.commit()
+
+async def _upsert_add(session, user_id: int, product_id: int) -> None:
+    await _cart_add_item(session, user_id, product_id, 1)
+    await session.commit()
+
+async def _run(session_maker, add, user_id: int, product_id: int, adds: int, concurrency: int) -> tuple[int, int, float]:
+    async with session_maker() as session:
+        await session.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await session.commit()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore, session_maker() as session:
+            try:
+                await add(session, user_id, product_id)
+            except IntegrityError:
+                # Две вставки новой позиции столкнулись на uq_cart_items_user_product
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(adds)))
+    elapsed = time.perf_counter() - started
+
+    async with session_maker() as session:
+        quantity = await session.scalar(
+            select(CartItemModel.quantity).where(CartItemModel.user_id == user_id, CartItemModel.product_id == product_id)
+        ) or 0
+        await session.execute(delete(CartItemModel).where(CartItemModel.user_id == user_id))
+        await session.commit()
+    return quantity, errors, elapsed
+
+async def main(adds: int, concurrency: int) -> None:
+    session_maker = make_session_maker()
+    async with session_maker() as session:
+        await seed_catalog(session, 1000)
+        (user_id,) = await seed_buyers(session, 1)
+        product_id = await session.scalar(select(ProductModel.id).where(ProductModel.is_active == True).limit(1))
+
+    print(f"{'mode':>8} {'expected':>9} {'quantity':>9} {'errors':>7} {'adds/s':>9}")
+    for name, add in (("legacy", _legacy_add), ("upsert", _upsert_add)):
+        quantity, errors, elapsed = await _run(session_maker, add, user_id, product_id, adds, concurrency)
+        print(f"{name:>8} {adds:>9} {quantity:>9} {errors:>7} {adds / elapsed:>9.0f}")
+        if name == "upsert":
+            assert quantity == adds and errors == 0, "lost increments in atomic upsert"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--adds", type=int, default=500, help="Сколько добавлений по одной штуке выполнить")
+    parser.add_argument("--concurrency", type=int, default=50, help="Сколько добавлений выполняется одновременно")
+    args = parser.parse_args()
+    asyncio.run(main(args.adds, args.concurrency))
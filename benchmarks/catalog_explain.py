@@ -0,0 +1,98 @@
+"""
+EXPLAIN ANALYZE для фильтров каталога: показывает выбранные планировщиком узлы и время
+каждой формы запроса GET /products/ и GET /products/category/{id}.
+Помогает поймать регрессию индексов: с --forbid-seqscan скрипт завершается с ошибкой,
+если селективная форма читает products полным сканированием, с --max-ms — если она медленнее порога.
+
+Запуск:
+    python -m benchmarks.catalog_explain --rows 1000000 --forbid-seqscan --max-ms 50
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from app.models import Product as ProductModel
+from app.utils import _explain
+from benchmarks.seed import make_session_maker, seed_catalog
+
+def _scan_nodes(node: dict) -> list[str]:
+    """
+    Собирает узлы чтения таблиц из дерева плана, например "Index Scan ix_products_active_price".
+    """
+    nodes = []
+    if "Index Name" in node or "Relation Name" in node:
+        nodes.append(f"{node['Node Type']} {node.get('Index Name', node.get('Relation Name'))}")
+    for child in node.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+def _filter_shapes(category_id: int, seller_id: int) -> dict[str, tuple[list, bool]]:
+    """
+    Формы фильтров, которые строит get_all_products (без учёта поиска):
+    имя -> (фильтры, допустим ли полный скан для COUNT).
+    Без фильтров и с in_stock=true под условие попадает почти весь каталог,
+    и последовательное чтение для них — верный выбор планировщика.
+    """
+    day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+    return {
+        "no filters": ([], True),
+        "category": ([ProductModel.category_id == category_id], False),
+        "category + price": ([ProductModel.category_id == category_id, ProductModel.price >= 100, ProductModel.price <= 200], False),
+        "price range": ([ProductModel.price >= 100, ProductModel.price <= 110], False),
+        "seller": ([ProductModel.seller_id == seller_id], False),
+        "in stock": ([ProductModel.stock > 0], True),
+        "out of stock": ([ProductModel.stock == 0], False),
+        "created since": ([ProductModel.created_at >= day_ago], False),
+    }
+
+async def main(rows: int, page_size: int, forbid_seqscan: bool, max_ms: float | None, dump: bool) -> int:
+    session_maker = make_session_maker()
+    failures = []
+    async with session_maker() as session:
+        await seed_catalog(session, rows)
+        category_id = await session.scalar(select(func.min(ProductModel.category_id)))
+        seller_id = await session.scalar(select(func.min(ProductModel.seller_id)))
+
+        # имя -> (запрос, допустим ли полный скан)
+        queries = {}
+        for shape, (filters, seqscan_ok) in _filter_shapes(category_id, seller_id).items():
+            where = [ProductModel.is_active == True, *filters]
+            queries[f"{shape} / page"] = (
+                select(ProductModel).where(*where).order_by(ProductModel.id).limit(page_size + 1),
+                False,
+            )
+            queries[f"{shape} / count"] = (select(func.count()).select_from(ProductModel).where(*where), seqscan_ok)
+        queries["by category endpoint"] = (
+            select(ProductModel).where(ProductModel.category_id == category_id, ProductModel.is_active == True),
+            False,
+        )
+
+        print(f"{'query':<28} {'exec, ms':>9} {'plan, ms':>9}  nodes")
+        for name, (stmt, seqscan_ok) in queries.items():
+            explained = await _explain(session, stmt, analyze=True)
+            nodes = _scan_nodes(explained["Plan"])
+            exec_ms = explained["Execution Time"]
+            print(f"{name:<28} {exec_ms:>9.2f} {explained['Planning Time']:>9.2f}  {', '.join(nodes)}")
+            if dump:
+                print(json.dumps(explained["Plan"], indent=2))
+
+            if forbid_seqscan and not seqscan_ok and any(node.startswith("Seq Scan") for node in nodes):
+                failures.append(f"{name}: sequential scan")
+            if max_ms is not None and exec_ms > max_ms:
+                failures.append(f"{name}: {exec_ms:.2f} ms > {max_ms} ms")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Сколько активных товаров должно быть в каталоге")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--forbid-seqscan", action="store_true", help="Считать полное сканирование products регрессией")
+    parser.add_argument("--max-ms", type=float, default=None, help="Порог времени выполнения одного запроса")
+    parser.add_argument("--dump", action="store_true", help="Печатать полные планы в JSON")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.rows, args.page_size, args.forbid_seqscan, args.max_ms, args.dump)))
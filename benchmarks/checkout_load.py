@@ -0,0 +1,127 @@
+"""
+Нагрузочный тест оформления заказов: много параллельных checkout на один «горячий» товар.
+
+У каждого покупателя в корзине одна позиция горячего товара; остаток товара меньше
+числа покупателей. Проверяется, что успешных заказов ровно столько, сколько позволяет
+остаток, и что остаток не ушёл в минус (нет перепродажи).
+
+С --slots тот же прогон повторяется для каждого количества слотов остатка горячего товара
+(0 — обычная строка products.stock, N — остаток разложен по N строкам product_stock_slots).
+
+С --held часть остатка перед прогоном забронирована под корзину другого пользователя
+(products.reserved) и проверяется, что забронированное не продаётся. Слоты вместе с бронями
+не работают: перед прогоном они складываются в products.stock так же, как это делает
+задача sync_stock_slots при STOCK_HOLDS_ENABLED.
+
+Запуск:
+    python -m benchmarks.checkout_load --buyers 500 --stock 100 --quantity 1 --concurrency 50
+    python -m benchmarks.checkout_load --buyers 2000 --stock 2000 --concurrency 100 --slots 1 16
+    python -m benchmarks.checkout_load --buyers 500 --stock 100 --held 30 --slots 0 16
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+# Измеряется только checkout: задачи обработки заказа уходят в брокер в памяти процесса и не выполняются,
+# кэши Redis (итоги корзины) — тоже в памяти процесса
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+os.environ.setdefault("REDIS_URL", "memory://")
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from app.models import CartItem as CartItemModel, Order as OrderModel, OrderItem as OrderItemModel, Product as ProductModel
+from app.models import ProductStockSlot, StockHold
+from app.cart_backend import SqlCartBackend
+from app.routers.orders import checkout_order
+from app.utils import _redistribute_stock_slots, _fold_stock_slots
+from benchmarks.seed import make_session_maker, seed_buyers, seed_catalog
+
+async def main(buyers: int, stock: int, quantity: int, concurrency: int, slots: int = 0, held: int = 0) -> None:
+    session_maker = make_session_maker()
+    async with session_maker() as session:
+        await seed_catalog(session, 1000)
+        # Бронь держит отдельный покупатель, который не оформляет заказ
+        buyer_ids = await seed_buyers(session, buyers + (1 if held else 0))
+        holder_id = buyer_ids.pop() if held else None
+        product_id = await session.scalar(
+            select(ProductModel.id).where(ProductModel.is_active == True).order_by(ProductModel.id).limit(1)
+        )
+        await session.execute(delete(CartItemModel).where(CartItemModel.user_id.in_(buyer_ids)))
+        await session.execute(delete(OrderModel).where(OrderModel.user_id.in_(buyer_ids)))
+        await session.execute(delete(StockHold).where(StockHold.product_id == product_id))
+        await session.execute(
+            update(ProductModel).where(ProductModel.id == product_id).values(stock=stock, reserved=held, stock_slots=slots)
+        )
+        await _redistribute_stock_slots(session, [product_id])
+        if held:
+            await session.execute(insert(StockHold).values(
+                user_id=holder_id, product_id=product_id, quantity=held, expires_at=func.now() + timedelta(hours=1),
+            ))
+            await _fold_stock_slots(session)
+        await session.execute(insert(CartItemModel), [
+            {"user_id": buyer_id, "product_id": product_id, "quantity": quantity} for buyer_id in buyer_ids
+        ])
+        await session.commit()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {"ordered": 0, "rejected": 0}
+    latencies = []
+
+    async def checkout(buyer_id: int) -> None:
+        async with semaphore, session_maker() as session:
+            started = time.perf_counter()
+            try:
+                await checkout_order(db=session, backend=SqlCartBackend(), current_user=SimpleNamespace(id=buyer_id))
+                outcomes["ordered"] += 1
+            except HTTPException as exc:
+                assert exc.status_code == 400, exc.detail
+                outcomes["rejected"] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(checkout(buyer_id) for buyer_id in buyer_ids))
+    elapsed = time.perf_counter() - started
+
+    async with session_maker() as session:
+        folded = slots and held
+        if slots and not held:
+            left = await session.scalar(
+                select(func.sum(ProductStockSlot.stock)).where(ProductStockSlot.product_id == product_id)
+            )
+        else:
+            left = await session.scalar(select(ProductModel.stock).where(ProductModel.id == product_id))
+        reserved = await session.scalar(select(ProductModel.reserved).where(ProductModel.id == product_id))
+        sold = await session.scalar(
+            select(func.coalesce(func.sum(OrderItemModel.quantity), 0))
+            .join(OrderModel, OrderModel.id == OrderItemModel.order_id)
+            .where(OrderModel.user_id.in_(buyer_ids), OrderItemModel.product_id == product_id)
+        )
+
+    latencies.sort()
+    print(f"stock slots: {slots or 'off'}" + (f", folded by stock holds ({held} held)" if folded else ""))
+    print(f"checkouts: {buyers}, ordered: {outcomes['ordered']}, rejected: {outcomes['rejected']}")
+    print(f"stock: {stock} -> {left}, reserved: {reserved}, sold: {sold}")
+    print(f"throughput: {buyers / elapsed:.0f} checkouts/s, "
+          f"p50: {latencies[len(latencies) // 2]:.1f} ms, p99: {latencies[int(len(latencies) * 0.99)]:.1f} ms")
+
+    expected = min(buyers, max(stock - held, 0) // quantity)
+    assert left >= 0, "stock went negative"
+    assert reserved == held and left >= held, "held stock was sold"
+    assert sold == stock - left, "sold quantity does not match stock decrement"
+    assert outcomes["ordered"] == expected, f"expected {expected} orders, got {outcomes['ordered']}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=500, help="Сколько покупателей одновременно оформляют заказ")
+    parser.add_argument("--stock", type=int, default=100, help="Начальный остаток горячего товара")
+    parser.add_argument("--quantity", type=int, default=1, help="Количество товара в каждой корзине")
+    parser.add_argument("--concurrency", type=int, default=50, help="Сколько checkout выполняется одновременно")
+    parser.add_argument("--slots", type=int, nargs="+", default=[0], help="Количество слотов остатка (0 — без слотов)")
+    parser.add_argument("--held", type=int, default=0, help="Сколько остатка забронировано под чужую корзину")
+    args = parser.parse_args()
+    for slots in args.slots:
+        asyncio.run(main(args.buyers, args.stock, args.quantity, args.concurrency, slots, args.held))
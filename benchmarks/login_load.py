@@ -0,0 +1,95 @@
+"""
+Задержка каталога под нагрузкой входов: bcrypt в event loop против пула потоков.
+
+Параллельно с непрерывными POST /users/token замеряется латентность GET /categories/tree
+(дерево отдаётся из памяти, поэтому его задержка — это задержка event loop).
+Режим --workers 0 считает bcrypt прямо в event loop, как до переноса в пул.
+
+Запуск:
+    python -m benchmarks.login_load --workers 0 4 --logins 8 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("REDIS_URL", "memory://")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+import httpx
+from sqlalchemy import text
+from app import auth
+from app.database import async_engine
+from app.main import app
+from app.password_hashing import PasswordHasher, pwd_context
+from app.config import BCRYPT_ROUNDS
+from benchmarks.seed import make_session_maker
+
+BENCH_LOGIN_EMAIL = "bench-login-{}@example.com"
+BENCH_PASSWORD = "bench-password"
+
+async def seed_login_users(count: int) -> list[str]:
+    """
+    Досоздаёт count пользователей с одним и тем же паролем и возвращает их email.
+    """
+    hashed = pwd_context.hash(BENCH_PASSWORD)
+    emails = [BENCH_LOGIN_EMAIL.format(number) for number in range(1, count + 1)]
+    async with make_session_maker()() as session:
+        for email in emails:
+            await session.execute(text(
+                "INSERT INTO users (email, hashed_password, is_active, role) "
+                "VALUES (:email, :hashed, true, 'buyer') "
+                "ON CONFLICT (email) DO UPDATE SET hashed_password = :hashed, is_active = true"
+            ), {"email": email, "hashed": hashed})
+        await session.commit()
+    return emails
+
+def _percentile(values: list[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+async def _measure(client: httpx.AsyncClient, emails: list[str], logins: int, duration: float) -> tuple[list[float], int]:
+    deadline = time.perf_counter() + duration
+    latencies = []
+    completed = 0
+
+    async def login_loop(email: str) -> None:
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            response = await client.post("/users/token", data={"username": email, "password": BENCH_PASSWORD})
+            assert response.status_code in (200, 503), response.text
+            completed += response.status_code == 200
+
+    async def probe_loop() -> None:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/categories/tree")
+            assert response.status_code == 200
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.005)
+
+    await asyncio.gather(probe_loop(), *(login_loop(emails[number % len(emails)]) for number in range(logins)))
+    return latencies, completed
+
+async def main(workers_modes: list[int], logins: int, duration: float) -> None:
+    emails = await seed_login_users(logins)
+    async_engine.sync_engine.echo = False
+
+    print(f"bcrypt rounds: {BCRYPT_ROUNDS}, concurrent logins: {logins}, {duration:g}s per mode")
+    print(f"{'workers':>8} {'logins/s':>9} {'tree p50 ms':>12} {'tree p99 ms':>12}")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        latencies, _ = await _measure(client, emails, 0, duration)
+        print(f"{'idle':>8} {0:>9} {_percentile(latencies, 0.5):>12.1f} {_percentile(latencies, 0.99):>12.1f}")
+        for workers in workers_modes:
+            auth.password_hasher = PasswordHasher(workers=workers)
+            latencies, completed = await _measure(client, emails, logins, duration)
+            print(f"{workers:>8} {completed / duration:>9.0f} "
+                  f"{_percentile(latencies, 0.5):>12.1f} {_percentile(latencies, 0.99):>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 4], help="Размеры пула хеширования (0 — в event loop)")
+    parser.add_argument("--logins", type=int, default=8, help="Сколько входов выполняется одновременно")
+    parser.add_argument("--duration", type=float, default=5, help="Длительность каждого режима, секунды")
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.logins, args.duration))
@@ -0,0 +1,55 @@
+"""
+Бенчмарк поиска товаров: подстрока (режим "like") против tsvector + триграмм (режим "fulltext").
+
+Запуск:
+    python -m benchmarks.product_search --rows 1000000 --terms "product 4242" "prodcut" "description 17"
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from sqlalchemy import select, func
+from app.models import Product as ProductModel
+from app.utils import _product_search
+from benchmarks.seed import make_session_maker, seed_catalog
+
+async def _measure(session, stmt, repeats: int) -> tuple[float, int]:
+    samples = []
+    found = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        found = len((await session.execute(stmt)).all())
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), found
+
+async def main(rows: int, terms: list[str], page_size: int, repeats: int) -> None:
+    session_maker = make_session_maker()
+    async with session_maker() as session:
+        await seed_catalog(session, rows)
+
+        print(f"{'term':<24} {'mode':<10} {'page, ms':>10} {'count, ms':>10} {'total':>8}")
+        for term in terms:
+            for mode in ("like", "fulltext"):
+                condition, rank = _product_search(term, mode)
+                page_stmt = select(ProductModel.id).where(ProductModel.is_active == True, condition)
+                if rank is not None:
+                    page_stmt = page_stmt.order_by(rank.desc(), ProductModel.id)
+                else:
+                    page_stmt = page_stmt.order_by(ProductModel.id)
+                page_ms, _ = await _measure(session, page_stmt.limit(page_size), repeats)
+
+                count_stmt = select(func.count()).select_from(ProductModel).where(ProductModel.is_active == True, condition)
+                started = time.perf_counter()
+                total = await session.scalar(count_stmt)
+                count_ms = (time.perf_counter() - started) * 1000
+
+                print(f"{term[:24]:<24} {mode:<10} {page_ms:>10.2f} {count_ms:>10.2f} {total:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Сколько активных товаров должно быть в каталоге")
+    parser.add_argument("--terms", nargs="+", default=["product 4242", "prodcut 4242", "description 17", "md5"], help="Поисковые запросы")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов на каждый замер (берётся медиана)")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.terms, args.page_size, args.repeats))
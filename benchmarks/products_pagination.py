@@ -0,0 +1,58 @@
+"""
+Бенчмарк GET /products/: OFFSET-пагинация против курсорной (keyset) на глубоких страницах.
+
+Запуск:
+    python -m benchmarks.products_pagination --rows 1000000 --pages 1 100 1000 5000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from sqlalchemy import select
+from app.models import Product as ProductModel
+from benchmarks.seed import make_session_maker, seed_catalog
+
+async def _timed(session, stmt, repeats: int) -> tuple[float, list]:
+    samples = []
+    rows = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = (await session.scalars(stmt)).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), rows
+
+async def main(rows: int, pages: list[int], page_size: int, repeats: int) -> None:
+    session_maker = make_session_maker()
+    async with session_maker() as session:
+        await seed_catalog(session, rows)
+
+        base = select(ProductModel).where(ProductModel.is_active == True).order_by(ProductModel.id)
+
+        print(f"{'page':>8} {'offset, ms':>12} {'cursor, ms':>12}")
+        for page in pages:
+            offset_stmt = base.offset((page - 1) * page_size).limit(page_size + 1)
+            offset_ms, offset_rows = await _timed(session, offset_stmt, repeats)
+
+            # Курсор на эту страницу — id последнего товара предыдущей страницы
+            last_id = await session.scalar(
+                select(ProductModel.id)
+                .where(ProductModel.is_active == True)
+                .order_by(ProductModel.id)
+                .offset((page - 1) * page_size - 1)
+                .limit(1)
+            ) if page > 1 else 0
+            cursor_stmt = base.where(ProductModel.id > last_id).limit(page_size + 1)
+            cursor_ms, cursor_rows = await _timed(session, cursor_stmt, repeats)
+
+            assert [p.id for p in offset_rows] == [p.id for p in cursor_rows], "pages differ"
+            print(f"{page:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+            session.expunge_all()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Сколько активных товаров должно быть в каталоге")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 5000], help="Номера проверяемых страниц")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов на каждый замер (берётся медиана)")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.pages, args.page_size, args.repeats))
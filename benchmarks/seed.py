@@ -0,0 +1,90 @@
+"""
+Общие утилиты бенчмарков: отдельный движок без echo и наполнение каталога тестовыми данными.
+"""
+import time
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.database import DATABASE_URL
+
+BENCH_SELLER_EMAIL = "bench-seller-{}@example.com"
+BENCH_CATEGORY_NAME = "Bench {}"
+BENCH_BUYER_EMAIL = "bench-buyer-{}@example.com"
+
+def make_session_maker() -> async_sessionmaker[AsyncSession]:
+    """
+    Создаёт фабрику сессий без логирования SQL, чтобы вывод не искажал замеры.
+    """
+    engine = create_async_engine(DATABASE_URL, echo=False)
+    return async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+async def seed_buyers(session: AsyncSession, count: int) -> list[int]:
+    """
+    Досоздаёт count покупателей и возвращает их id.
+    """
+    buyer_ids = []
+    for number in range(1, count + 1):
+        buyer_ids.append(await session.scalar(text(
+            "INSERT INTO users (email, hashed_password, is_active, role) "
+            "VALUES (:email, 'x', true, 'buyer') "
+            "ON CONFLICT (email) DO UPDATE SET is_active = true RETURNING id"
+        ), {"email": BENCH_BUYER_EMAIL.format(number)}))
+    await session.commit()
+    return buyer_ids
+
+async def seed_catalog(session: AsyncSession, rows: int, categories: int = 20, sellers: int = 50) -> None:
+    """
+    Досоздаёт продавцов, категории и товары, пока в каталоге не наберётся rows активных товаров.
+    Товары равномерно распределяются по категориям и продавцам и генерируются
+    одним INSERT ... SELECT generate_series.
+    """
+    seller_ids = []
+    for number in range(1, sellers + 1):
+        seller_ids.append(await session.scalar(text(
+            "INSERT INTO users (email, hashed_password, is_active, role) "
+            "VALUES (:email, 'x', true, 'seller') "
+            "ON CONFLICT (email) DO UPDATE SET is_active = true RETURNING id"
+        ), {"email": BENCH_SELLER_EMAIL.format(number)}))
+
+    category_ids = []
+    for number in range(1, categories + 1):
+        name = BENCH_CATEGORY_NAME.format(number)
+        category_id = await session.scalar(text(
+            "SELECT id FROM categories WHERE name = :name AND parent_id IS NULL"
+        ), {"name": name})
+        if category_id is None:
+            category_id = await session.scalar(text(
+                "INSERT INTO categories (name, is_active) VALUES (:name, true) RETURNING id"
+            ), {"name": name})
+        category_ids.append(category_id)
+    await session.commit()
+
+    existing = await session.scalar(text("SELECT count(*) FROM products WHERE is_active"))
+    missing = rows - existing
+    if missing <= 0:
+        return
+
+    started = time.perf_counter()
+    await session.execute(text(
+        "INSERT INTO products (name, description, price, stock, is_active, seller_id, category_id, created_at, updated_at) "
+        "SELECT 'Product ' || g || ' ' || md5(g::text), "
+        "       'Description of product ' || g, "
+        "       round((random() * 1000 + 1)::numeric, 2), "
+        "       (random() * 50)::int, true, "
+        "       (CAST(:seller_ids AS int[]))[1 + g % :sellers], "
+        "       (CAST(:category_ids AS int[]))[1 + g % :categories], "
+        "       now() - (g || ' seconds')::interval, now() "
+        "FROM generate_series(1, :missing) AS g"
+    ), {
+        "seller_ids": seller_ids,
+        "sellers": len(seller_ids),
+        "category_ids": category_ids,
+        "categories": len(category_ids),
+        "missing": missing,
+    })
+    await session.commit()
+
+    # VACUUM нельзя выполнять в транзакции; карта видимости нужна для index-only scan
+    async with session.bind.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE products"))
+    print(f"Seeded {missing} products in {time.perf_counter() - started:.1f}s")